@@ -1,7 +1,10 @@
 from django.contrib import admin
-from .models import FoodListing, Restaurant, NGO, FoodClaim
+from .models import FoodListing, Restaurant, NGO, FoodClaim, DonationDailyRollup, ArchivedFoodListing, ArchivedFoodClaim
 
 admin.site.register(FoodListing)
 admin.site.register(Restaurant)
 admin.site.register(NGO)
 admin.site.register(FoodClaim)
+admin.site.register(DonationDailyRollup)
+admin.site.register(ArchivedFoodListing)
+admin.site.register(ArchivedFoodClaim)
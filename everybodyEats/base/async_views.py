@@ -0,0 +1,302 @@
+import asyncio
+import calendar
+from datetime import date, datetime, time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.db.models import F, Max, Q, Sum, Window
+from django.db.models.functions import RowNumber, TruncMonth
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+
+from .cache import acache_response
+from .events import RESYNC, broker
+from .geo import nearby
+from .models import CLOSED_LISTING_STATUSES, DonationDailyRollup, FoodClaim, FoodListing, Restaurant
+from .pagination import FoodListingCursorPagination
+from .renderers import FastJSONRenderer
+from .search import search_food_listings
+from .serializers import FoodListingSerializer, RestaurantSerializer
+from . import views
+
+# Async versions of the public read-only endpoints. They use Django's async ORM, so under
+# ASGI a slow query doesn't tie up a worker thread; under WSGI Django runs them in an event
+# loop per request, so they keep working unchanged.
+
+
+def render_json(data, status=status.HTTP_200_OK):
+    # Render with the same JSON renderer as the DRF views so the output matches
+    renderer = FastJSONRenderer()
+    return HttpResponse(renderer.render(data), content_type=renderer.media_type, status=status)
+
+
+class AsyncReadView(View):
+    # Django applies CSRF checks to plain views; these views (and the DRF view that
+    # FoodListingView hands writes to) use token auth, so opt out like DRF does
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+
+food_listing_write_view = views.FoodListingView.as_view()
+
+
+# View to list food listings (writes are handed to the DRF view)
+class FoodListingView(AsyncReadView):
+    async def get(self, request):
+        drf_request = Request(request)
+        try:
+            queryset = views.filter_food_listings(FoodListing.objects.all(), drf_request.query_params)
+        except ValidationError as exc:
+            return render_json(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+        paginator = FoodListingCursorPagination()
+
+        # ?q= results are ranked, so they come back as one page of the best matches
+        query = drf_request.query_params.get("q")
+        if query:
+            rows = FoodListingSerializer.values_queryset(search_food_listings(queryset, query))
+            rows = [row async for row in rows[:paginator.get_page_size(drf_request)]]
+            return render_json({
+                "next": None,
+                "previous": None,
+                "results": FoodListingSerializer.values_data(rows),
+            })
+
+        # DRF's cursor paginator evaluates the page itself, so run it like the async ORM does
+        queryset = FoodListingSerializer.values_queryset(queryset)
+        page = await sync_to_async(paginator.paginate_queryset)(queryset, drf_request)
+        return render_json({
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "results": FoodListingSerializer.values_data(page),
+        })
+
+    async def post(self, request):
+        return await sync_to_async(food_listing_write_view)(request)
+
+
+# View to find the available food listings closest to a location (e.g. the NGO's),
+# nearest first: /api/food-listings/nearby/?lat=..&lon=..&radius=<km>&limit=..
+class NearbyFoodListingView(AsyncReadView):
+    default_radius_km = 5
+    max_radius_km = 50
+    default_limit = 50
+    max_limit = 200
+
+    async def get(self, request):
+        try:
+            latitude = views.parse_number_param(request.GET, "lat", -90, 90)
+            longitude = views.parse_number_param(request.GET, "lon", -180, 180)
+            radius_km = views.parse_number_param(
+                request.GET, "radius", 0, self.max_radius_km, default=self.default_radius_km
+            )
+            limit = views.parse_number_param(
+                request.GET, "limit", 1, self.max_limit, default=self.default_limit, cast=int
+            )
+        except ValidationError as exc:
+            return render_json(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+
+        # Bounding box on the indexed coordinates, then the exact distance for what's left
+        listings = nearby(
+            FoodListing.objects.exclude(status__in=CLOSED_LISTING_STATUSES), latitude, longitude, radius_km
+        )
+        rows = listings.values(*FoodListingSerializer.values_lookups(), "distance_km")[:limit]
+
+        rows = [row async for row in rows]
+        results = FoodListingSerializer.values_data(rows)
+        for listing, row in zip(results, rows):
+            listing["distance_km"] = round(row["distance_km"], 3)
+        return render_json({"results": results})
+
+
+# Live updates to the food listings feed as Server-Sent Events. Clients fetch the feed
+# once, then apply the deltas: listing.created (the new listing), listing.updated and
+# listing.claimed (id, remaining_quantity, status). On a "resync" event they refetch.
+# Expiry is not streamed: the expire_food_listings job runs in its own process, which
+# has no connected clients, so clients drop a listing themselves once its
+# pickup_window_end has passed.
+# Needs an ASGI server: under WSGI a streaming response can't be held open.
+class FoodListingEventsView(AsyncReadView):
+    async def get(self, request):
+        response = StreamingHttpResponse(self.stream(), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        # Stop proxies such as nginx from buffering the stream
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    async def stream(self):
+        subscription = broker.subscribe()
+        renderer = FastJSONRenderer()
+        loop = asyncio.get_running_loop()
+        # Streams are closed after a while and the browser reconnects, so connections whose
+        # client has gone away are not kept around indefinitely
+        deadline = loop.time() + settings.EVENT_STREAM_MAX_SECONDS
+        try:
+            yield f"retry: {settings.EVENT_STREAM_RETRY_MS}\n\n"
+            while loop.time() < deadline:
+                try:
+                    event_id, event_type, data = await asyncio.wait_for(
+                        subscription.get(), timeout=settings.EVENT_STREAM_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    # Comment line to keep idle connections open
+                    yield ": keep-alive\n\n"
+                    continue
+                if event_type == RESYNC:
+                    yield f"event: {RESYNC}\ndata: {{}}\n\n"
+                    break
+                yield f"id: {event_id}\nevent: {event_type}\ndata: {renderer.render(data).decode()}\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+
+class RestaurantDetailView(AsyncReadView):
+    @acache_response("restaurant_detail", models=(Restaurant, FoodListing, FoodClaim))
+    async def get(self, request, pk):
+        try:
+            # Fetch restaurant by ID
+            restaurant = await views.restaurants_with_food_listings().aget(id=pk)
+        except Restaurant.DoesNotExist:
+            return render_json(
+                {"detail": "Restaurant not found."}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        # Serialize the restaurant and include food listings (already prefetched)
+        return render_json(RestaurantSerializer(restaurant).data)
+
+
+class DonationStatisticsView(AsyncReadView):
+
+    @acache_response("donation_statistics", models=(DonationDailyRollup, FoodClaim, FoodListing, Restaurant))
+    async def get(self, request):
+        # The async ORM runs every query of this request on the same thread-sensitive
+        # executor thread, so these run one after the other; awaiting them keeps the
+        # event loop free in the meantime
+        stats = await self.donation_totals()
+        recent_donations_data = await self.recent_donations()
+
+        # Format the response
+        response_data = {
+            "total_donations": {
+                "total_donations": stats['total_claims'] or 0,
+                "total_quantity": stats['total_quantity'] or 0,
+            },
+            "current_month_donations": {
+                "total_donations": stats['current_month_claims'] or 0,
+                "total_quantity": stats['current_month_quantity'] or 0,
+            },
+            "last_month_donations": {
+                "total_donations": stats['last_month_claims'] or 0,
+                "total_quantity": stats['last_month_quantity'] or 0,
+            },
+            "recent_donations": recent_donations_data
+        }
+
+        return render_json(response_data)
+
+    async def donation_totals(self):
+        # Current date
+        today = timezone.localdate()
+
+        # Month boundaries as day ranges over the daily rollup
+        current_month_start = today.replace(day=1)
+        last_month_start = (current_month_start - timedelta(days=1)).replace(day=1)
+        next_month_start = (current_month_start + timedelta(days=32)).replace(day=1)
+        current_month = Q(day__gte=current_month_start, day__lt=next_month_start)
+        last_month = Q(day__gte=last_month_start, day__lt=current_month_start)
+
+        # Calculate total, current month's and last month's donations in a single pass
+        # over the per-day rollup rather than over every claim
+        return await DonationDailyRollup.objects.aaggregate(
+            total_claims=Sum('claims_count'),
+            total_quantity=Sum('quantity'),
+            current_month_claims=Sum('claims_count', filter=current_month),
+            current_month_quantity=Sum('quantity', filter=current_month),
+            last_month_claims=Sum('claims_count', filter=last_month),
+            last_month_quantity=Sum('quantity', filter=last_month),
+        )
+
+    async def recent_donations(self):
+        # The five most recent donors all donated on or after the fifth-latest
+        # "last donation day" in the rollup, so only claims from then on need ranking
+        recent_claims = FoodClaim.objects.all()
+        cutoff_day = await (
+            DonationDailyRollup.objects.filter(restaurant__isnull=False)
+            .values('restaurant')
+            .annotate(last_day=Max('day'))
+            .order_by('-last_day')
+            .values_list('last_day', flat=True)[4:5]
+        ).afirst()
+        if cutoff_day:
+            recent_claims = recent_claims.filter(
+                claimed_at__gte=timezone.make_aware(datetime.combine(cutoff_day, time.min))
+            )
+
+        # Fetch recent donations (last 5 restaurants with their most recent donation). The
+        # window function ranks each restaurant's claims newest first, so filtering on the
+        # rank picks the actual most recent claim (and its quantity) in one query
+        recent_claims = (
+            recent_claims.select_related('food_listing__restaurant')
+            .filter(food_listing__restaurant__isnull=False)  # Ensure restaurant exists
+            .annotate(
+                restaurant_rank=Window(
+                    expression=RowNumber(),
+                    partition_by=[F('food_listing__restaurant')],
+                    order_by=[F('claimed_at').desc(nulls_last=True), F('id').desc()],
+                )
+            )
+            .filter(restaurant_rank=1)
+            .order_by(F('claimed_at').desc(nulls_last=True), '-id')
+        )[:5]
+
+        # Format the response for recent donations
+        recent_donations_data = []
+        async for recent_claim in recent_claims:
+            recent_donations_data.append({
+                'restaurant_name': recent_claim.food_listing.restaurant.name,
+                'most_recent_donation': {
+                    'food_name': recent_claim.food_listing.food_name,
+                    'claimed_quantity': recent_claim.claimed_quantity,
+                    'pickup_address': recent_claim.food_listing.pickup_address,
+                    'donation_date': recent_claim.claimed_at  # Encoded by the renderer (ISO 8601)
+                }
+            })
+        return recent_donations_data
+
+
+class MonthlyDonationStatsView(AsyncReadView):
+
+    @acache_response("monthly_donations", models=(DonationDailyRollup, FoodClaim))
+    async def get(self, request):
+        # Current date to get this year
+        current_year = timezone.localdate().year
+
+        # Query to get number of donations and total quantity for each month in the current
+        # year, summed from the per-day rollup
+        donations_per_month = DonationDailyRollup.objects.filter(
+            day__gte=date(current_year, 1, 1),  # Filter rollups from this year
+            day__lt=date(current_year + 1, 1, 1),
+        ).annotate(month=TruncMonth('day')).values('month').annotate(
+            donations_count=Sum('claims_count'),  # Count the number of donations
+            total_claimed_quantity=Sum('quantity')  # Sum the claimed quantity
+        ).order_by('month')  # Order by month
+
+        # Format the data into a list of dictionaries
+        monthly_donations = []
+        async for donation in donations_per_month:
+            monthly_donations.append({
+                'month': calendar.month_name[donation['month'].month],  # Month name (e.g. January, February)
+                'year': donation['month'].year,
+                'donations_count': donation['donations_count'],
+                'total_claimed_quantity': donation['total_claimed_quantity'],  # Total claimed quantity
+            })
+
+        return render_json({
+            'monthly_donations': monthly_donations
+        })
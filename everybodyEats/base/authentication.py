@@ -0,0 +1,51 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+def _token_cache_key(key):
+    # Never put the raw token into cache keys
+    return "auth-token:" + hashlib.sha256(key.encode()).hexdigest()
+
+
+def forget_token(key):
+    cache.delete(_token_cache_key(key))
+
+
+# The user fields kept in the cache: enough for permissions and role lookups, and never
+# the password hash
+CACHED_USER_FIELDS = ("id", "username", "email", "is_active", "is_staff", "is_superuser")
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that keeps the token -> user resolution in the cache for
+    AUTH_TOKEN_CACHE_TTL seconds, so polling clients don't hit the database just to
+    authenticate. Entries are dropped when the token is deleted (logout) or its user is
+    changed or deleted (see base.signals); with several processes that needs a shared
+    cache backend (see base.checks), so the TTL defaults to 0 (no caching) with the local
+    memory cache.
+
+    On a cache hit request.user is built from CACHED_USER_FIELDS only, so it must not be
+    saved.
+    """
+
+    def authenticate_credentials(self, key):
+        if settings.AUTH_TOKEN_CACHE_TTL <= 0:
+            return super().authenticate_credentials(key)
+        cache_key = _token_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return User(**cached), Token(key=key, user_id=cached["id"])
+
+        user, token = super().authenticate_credentials(key)
+        cache.set(
+            cache_key,
+            {field: getattr(user, field) for field in CACHED_USER_FIELDS},
+            settings.AUTH_TOKEN_CACHE_TTL,
+        )
+        return user, token
@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+# Shared by the benchmark_* management commands. They time representative work in this
+# process against the configured database and report latency percentiles. Rows they seed
+# are rolled back at the end, so they can be pointed at a copy of real data.
+
+
+def time_calls(func, iterations, warmup=5):
+    # Wall-clock seconds of each call to func, sorted
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(iterations):
+        started = perf_counter()
+        func()
+        timings.append(perf_counter() - started)
+    return sorted(timings)
+
+
+def percentile(timings, fraction):
+    return timings[min(int(len(timings) * fraction), len(timings) - 1)]
+
+
+@contextmanager
+def rolled_back():
+    with transaction.atomic():
+        yield
+        transaction.set_rollback(True)
+
+
+class BenchmarkCommand(BaseCommand):
+    default_iterations = 200
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=self.default_iterations,
+            help=f"Timed runs per case (default {self.default_iterations}).",
+        )
+
+    def report(self, label, timings):
+        mean = sum(timings) / len(timings)
+        self.stdout.write(
+            f"{label:<32} p50 {percentile(timings, 0.5) * 1000:9.3f} ms   "
+            f"p99 {percentile(timings, 0.99) * 1000:9.3f} ms   mean {mean * 1000:9.3f} ms"
+        )
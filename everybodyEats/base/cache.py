@@ -0,0 +1,133 @@
+import hashlib
+import json
+from functools import partial, wraps
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+
+
+def response_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _generation_key(model):
+    return f"response-cache:generation:{model._meta.label_lower}"
+
+
+def _generations(models):
+    # Every model has a random generation token; cached responses are keyed on the tokens
+    # of the models they were built from, so changing a token orphans those entries. A
+    # token that was evicted is simply replaced, which also orphans the old entries.
+    cache = response_cache()
+    keys = [_generation_key(model) for model in models]
+    tokens = cache.get_many(keys)
+    for key in keys:
+        if key not in tokens:
+            cache.add(key, uuid4().hex, None)
+            tokens[key] = cache.get(key)
+    return [tokens[key] for key in keys]
+
+
+async def _agenerations(models):
+    cache = response_cache()
+    keys = [_generation_key(model) for model in models]
+    tokens = await cache.aget_many(keys)
+    for key in keys:
+        if key not in tokens:
+            await cache.aadd(key, uuid4().hex, None)
+            tokens[key] = await cache.aget(key)
+    return [tokens[key] for key in keys]
+
+
+def _response_key(name, request, generations):
+    key_source = "|".join([name, request.get_full_path(), *generations])
+    return "response-cache:" + hashlib.md5(key_source.encode()).hexdigest()
+
+
+def _bump_generation(model):
+    response_cache().set(_generation_key(model), uuid4().hex, None)
+
+
+def invalidate_model(model):
+    """
+    Invalidate every cached response built from `model` once the current transaction
+    commits (immediately when not in a transaction).
+    """
+    transaction.on_commit(partial(_bump_generation, model))
+
+
+def cache_response(name, models):
+    """
+    Cache the data of a successful GET response for RESPONSE_CACHE_TTLS[name] seconds and
+    answer If-None-Match requests with 304 Not Modified.
+
+    Entries are keyed on the full request path and invalidated whenever one of `models`
+    is saved or deleted (see base.signals). A TTL of 0 disables caching for the endpoint.
+    """
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapped(view, request, *args, **kwargs):
+            ttl = settings.RESPONSE_CACHE_TTLS.get(name, 0)
+            if not ttl:
+                return view_method(view, request, *args, **kwargs)
+
+            cache = response_cache()
+            key = _response_key(name, request, _generations(models))
+
+            cached = cache.get(key)
+            if cached is None:
+                response = view_method(view, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                payload = json.dumps(response.data, sort_keys=True, default=str)
+                cached = (response.data, quote_etag(hashlib.md5(payload.encode()).hexdigest()))
+                cache.set(key, cached, ttl)
+
+            data, etag = cached
+            response = Response(data, headers={"ETag": etag})
+            return get_conditional_response(request, etag=etag, response=response)
+
+        return wrapped
+
+    return decorator
+
+
+def acache_response(name, models):
+    """
+    `cache_response` for async view handlers: caches the rendered body of a successful
+    response and answers If-None-Match requests with 304 Not Modified.
+    """
+
+    def decorator(view_method):
+        @wraps(view_method)
+        async def wrapped(view, request, *args, **kwargs):
+            ttl = settings.RESPONSE_CACHE_TTLS.get(name, 0)
+            if not ttl:
+                return await view_method(view, request, *args, **kwargs)
+
+            cache = response_cache()
+            key = _response_key(name, request, await _agenerations(models))
+
+            cached = await cache.aget(key)
+            if cached is None:
+                response = await view_method(view, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                etag = quote_etag(hashlib.md5(response.content).hexdigest())
+                cached = (response.content, response["Content-Type"], etag)
+                await cache.aset(key, cached, ttl)
+
+            content, content_type, etag = cached
+            response = HttpResponse(content, content_type=content_type, headers={"ETag": etag})
+            return get_conditional_response(request, etag=etag, response=response)
+
+        return wrapped
+
+    return decorator
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core import checks
+
+LOCMEM_BACKEND = "django.core.cache.backends.locmem.LocMemCache"
+
+
+def is_per_process_cache(alias):
+    # Local memory caches aren't shared between workers, so invalidating an entry in one
+    # worker leaves every other worker with the stale copy
+    return settings.CACHES.get(alias, {}).get("BACKEND") == LOCMEM_BACKEND
+
+
+@checks.register(checks.Tags.caches)
+def check_token_cache(app_configs, **kwargs):
+    if settings.AUTH_TOKEN_CACHE_TTL > 0 and is_per_process_cache("default"):
+        return [
+            checks.Warning(
+                "Authentication tokens are cached in a local memory cache, so a token deleted "
+                "at logout keeps working in the other worker processes for up to "
+                "AUTH_TOKEN_CACHE_TTL seconds.",
+                hint="Use a shared CACHE_BACKEND (e.g. Redis) when running several processes, "
+                "or set AUTH_TOKEN_CACHE_TTL=0.",
+                id="base.W001",
+            )
+        ]
+    return []
+
+
+@checks.register(checks.Tags.caches)
+def check_jwt_blacklist_cache(app_configs, **kwargs):
+    alias = settings.JWT_BLACKLIST_CACHE_ALIAS
+    if settings.JWT_AUTH_ENABLED and is_per_process_cache(alias):
+        return [
+            checks.Error(
+                f"The JWT blacklist cache ({alias!r}) is a local memory cache, so a token "
+                "revoked at logout would keep working in every other worker process until "
+                "it expires.",
+                hint="Point JWT_BLACKLIST_CACHE_ALIAS at a shared cache (e.g. Redis).",
+                id="base.E001",
+            )
+        ]
+    return []
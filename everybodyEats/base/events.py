@@ -0,0 +1,95 @@
+import asyncio
+import itertools
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+# In-process pub/sub for the live food listing stream (/api/food-listings/events/). The
+# write paths publish small delta events once their transaction commits, and every
+# connected stream gets them through its own bounded queue. Only clients connected to the
+# same process see an event, so run a single ASGI process per stream (or put a shared
+# broker such as Redis pub/sub behind publish() when scaling out).
+
+LISTING_CREATED = "listing.created"
+LISTING_UPDATED = "listing.updated"
+LISTING_CLAIMED = "listing.claimed"
+# Sent to a client that fell too far behind; it should refetch the feed and reconnect
+RESYNC = "resync"
+
+
+class Subscription:
+    def __init__(self, loop, max_queue_size):
+        self.loop = loop
+        self.queue = asyncio.Queue(max_queue_size)
+        self.closed = False
+
+    def deliver(self, event):
+        # Runs on the subscriber's event loop. Publishers never wait on a slow client:
+        # when its queue is full, the backlog is dropped and replaced by a resync event
+        if self.closed:
+            return
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait((None, RESYNC, {}))
+            self.closed = True
+            return
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class EventBroker:
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self):
+        # Must be called from the event loop the subscription will be read on
+        subscription = Subscription(asyncio.get_running_loop(), settings.EVENT_STREAM_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event_type, data):
+        # Safe to call from any thread (sync views run outside the subscribers' loops)
+        with self._lock:
+            event = (next(self._ids), event_type, data)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's loop has been closed
+                self.unsubscribe(subscription)
+
+
+broker = EventBroker()
+
+
+def publish_on_commit(event_type, data):
+    """
+    Publish an event once the current transaction commits (immediately when not in a
+    transaction), so clients never hear about writes that were rolled back.
+    """
+    transaction.on_commit(lambda: broker.publish(event_type, data))
+
+
+def publish_listing_change(food_listing):
+    # Remaining quantity and status after a claim; fully claimed listings get their own
+    # event so clients can drop them
+    publish_on_commit(
+        LISTING_CLAIMED if food_listing.status == "claimed" else LISTING_UPDATED,
+        {
+            "id": food_listing.pk,
+            "remaining_quantity": food_listing.remaining_quantity,
+            "status": food_listing.status,
+        },
+    )
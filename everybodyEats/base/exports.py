@@ -0,0 +1,86 @@
+import csv
+import json
+from datetime import date, datetime
+from itertools import chain, islice
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+# Rows are pulled from the database in chunks of this size while the response streams
+EXPORT_CHUNK_SIZE = 2000
+
+
+# The export views stream their own responses; these renderers only let DRF's content
+# negotiation accept ?format=csv / ?format=ndjson
+class CSVRenderer(BaseRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class _Echo:
+    # File-like object for csv.writer that hands back each line instead of storing it
+    def write(self, value):
+        return value
+
+
+def _export_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _row_encoder(export_format, columns):
+    # (header, function turning a row into its line, content type) for the export format
+    if export_format == NDJSONRenderer.format:
+        def encode(row):
+            return json.dumps(dict(zip(columns, map(_export_value, row)))) + "\n"
+        return "", encode, NDJSONRenderer.media_type
+
+    writer = csv.writer(_Echo())
+
+    def encode(row):
+        return writer.writerow([_export_value(value) for value in row])
+    return writer.writerow(columns), encode, CSVRenderer.media_type
+
+
+async def _stream_async(header, encode, rows):
+    # Under ASGI Django would drain a sync iterator into memory before sending anything, so
+    # fetch each chunk in the request's thread-sensitive executor (where its database
+    # connection lives) and send it from the event loop as it arrives
+    next_chunk = sync_to_async(lambda: list(islice(rows, EXPORT_CHUNK_SIZE)))
+    try:
+        if header:
+            yield header
+        while chunk := await next_chunk():
+            yield "".join(map(encode, chunk))
+    finally:
+        await sync_to_async(rows.close)()
+
+
+def streaming_export(export_format, columns, rows, filename, asynchronous=False):
+    """
+    Stream `rows` (a generator of tuples matching `columns`, e.g. values_list().iterator())
+    as CSV or NDJSON without holding the export in memory. Pass asynchronous=True when
+    serving the request through ASGI.
+    """
+    header, encode, content_type = _row_encoder(export_format, columns)
+    if asynchronous:
+        content = _stream_async(header, encode, rows)
+    else:
+        content = chain([header] if header else [], map(encode, rows))
+
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{export_format}"'
+    return response
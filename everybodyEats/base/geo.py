@@ -0,0 +1,213 @@
+import hashlib
+import json
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http.client import HTTPException
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+from django.utils.module_loading import import_string
+
+from .cache import invalidate_model
+
+logger = logging.getLogger(__name__)
+
+# Mean Earth radius, used for both the bounding box and the haversine distance
+EARTH_RADIUS_KM = 6371.0088
+
+
+# Geocoders turn a free-text address into (latitude, longitude), or None when the address
+# can't be located. settings.GEOCODER picks the implementation.
+class NullGeocoder:
+    # Default: no lookups, so only coordinates supplied by the client are stored
+    def geocode(self, address):
+        return None
+
+
+class StubGeocoder:
+    # Local geocoder for development and tests. Addresses listed in
+    # settings.GEOCODER_STUB_LOCATIONS map to their coordinates, and addresses that are
+    # written as "lat,lon" are read as-is
+    def geocode(self, address):
+        locations = getattr(settings, "GEOCODER_STUB_LOCATIONS", {})
+        if address in locations:
+            return tuple(locations[address])
+        try:
+            latitude, longitude = (float(part) for part in address.split(","))
+        except ValueError:
+            return None
+        if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+            return latitude, longitude
+        return None
+
+
+class GeocoderUnavailable(Exception):
+    # The geocoder couldn't answer (network error, bad response); unlike "not found" this
+    # isn't cached, and pending addresses stay pending so they are retried later
+    pass
+
+
+class NominatimGeocoder:
+    # OpenStreetMap's Nominatim search API (or a self-hosted instance at GEOCODER_URL).
+    # The public service allows one request per second, which is enforced per process
+    url = "https://nominatim.openstreetmap.org/search"
+    timeout = 5
+    min_interval = 1.0
+    _lock = threading.Lock()
+    _last_request = 0.0
+
+    def geocode(self, address):
+        query = urlencode({"q": address, "format": "json", "limit": 1})
+        request = Request(
+            f"{getattr(settings, 'GEOCODER_URL', None) or self.url}?{query}",
+            headers={"User-Agent": getattr(settings, "GEOCODER_USER_AGENT", "everybody-eats")},
+        )
+        with NominatimGeocoder._lock:
+            time.sleep(max(NominatimGeocoder._last_request + self.min_interval - time.monotonic(), 0))
+            try:
+                with urlopen(request, timeout=self.timeout) as response:
+                    results = json.load(response)
+                if not results:
+                    return None
+                return float(results[0]["lat"]), float(results[0]["lon"])
+            except (OSError, HTTPException, ValueError, KeyError, IndexError, TypeError) as exc:
+                raise GeocoderUnavailable(f"Geocoding failed for {address!r}") from exc
+            finally:
+                NominatimGeocoder._last_request = time.monotonic()
+
+
+def get_geocoder():
+    return import_string(getattr(settings, "GEOCODER", "base.geo.NullGeocoder"))()
+
+
+def geocoding_enabled():
+    return getattr(settings, "GEOCODER", "base.geo.NullGeocoder") != "base.geo.NullGeocoder"
+
+
+def _geocode_cache_key(address):
+    return "geocode:" + hashlib.sha256(address.strip().lower().encode()).hexdigest()
+
+
+def cached_geocode(address):
+    # (found, location) from the cache alone: found is False when the address hasn't been
+    # looked up yet, location is None when it was looked up but not found
+    cached = cache.get(_geocode_cache_key(address)) if address else None
+    if cached is None:
+        return False, None
+    return True, tuple(cached) or None
+
+
+def geocode(address):
+    # Look up an address, caching the answer (including "not found") so the same address
+    # is only sent to the geocoder once per GEOCODER_CACHE_TTL. Blocks on the geocoder, so
+    # requests use cached_geocode() and leave the rest to geocode_later(). Raises
+    # GeocoderUnavailable when the geocoder can't answer
+    if not address:
+        return None
+    found, location = cached_geocode(address)
+    if found:
+        return location
+    location = get_geocoder().geocode(address)
+    cache.set(_geocode_cache_key(address), location or (), getattr(settings, "GEOCODER_CACHE_TTL", 86400))
+    return location
+
+
+def geocode_rows(queryset, address_field, fallback_fields=()):
+    """
+    Geocode the address of each row in `queryset` and store the location, or the
+    (latitude, longitude) in `fallback_fields` when the address isn't found, clearing
+    location_pending. Returns the number of rows that got a location; stops at the first
+    GeocoderUnavailable, which propagates with the remaining rows still pending.
+    """
+    located = processed = 0
+    rows = queryset.values_list("pk", address_field, *fallback_fields)
+    for pk, address, *fallback in rows.iterator():
+        processed += 1
+        location = geocode(address) or fallback or None
+        update = {"location_pending": False}
+        if location and location[0] is not None:
+            update["latitude"], update["longitude"] = location
+            located += 1
+        queryset.model.objects.filter(pk=pk).update(**update)
+    if processed:
+        # update() sends no signals, so drop the cached responses showing the old rows
+        invalidate_model(queryset.model)
+    return located
+
+
+# Addresses that weren't in the geocoding cache when their row was created are looked up
+# here, one at a time, after the request has been answered. Rows still pending when the
+# process stops are picked up by the geocode_addresses command
+_geocoding_queue = ThreadPoolExecutor(max_workers=1, thread_name_prefix="geocoder")
+
+
+def _geocode_pending(model, address_field, pks):
+    try:
+        geocode_rows(model.objects.filter(pk__in=pks, location_pending=True), address_field)
+    except GeocoderUnavailable:
+        logger.warning("Geocoder unavailable; %d row(s) left pending", len(pks), exc_info=True)
+    except Exception:
+        logger.exception("Background geocoding failed")
+    finally:
+        connection.close()
+
+
+def geocode_later(model, address_field, pks):
+    # Queue the rows for background geocoding once the current transaction commits
+    if pks:
+        transaction.on_commit(partial(_geocoding_queue.submit, _geocode_pending, model, address_field, list(pks)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    # Latitude/longitude ranges that contain every point within radius_km of the origin.
+    # Returns a Q over the indexed latitude/longitude columns; it only narrows the rows
+    # the exact distance is computed for
+    delta_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    box = Q(latitude__gte=latitude - delta_lat, latitude__lte=latitude + delta_lat)
+
+    # Near the poles the box covers every longitude
+    if abs(latitude) + delta_lat >= 90:
+        return box & Q(longitude__isnull=False)
+
+    delta_lon = math.degrees(radius_km / (EARTH_RADIUS_KM * math.cos(math.radians(latitude))))
+    if delta_lon >= 180:
+        return box & Q(longitude__isnull=False)
+    min_lon, max_lon = longitude - delta_lon, longitude + delta_lon
+    # Boxes crossing the antimeridian wrap around to the other side
+    if min_lon < -180:
+        return box & (Q(longitude__gte=min_lon + 360) | Q(longitude__lte=max_lon))
+    if max_lon > 180:
+        return box & (Q(longitude__gte=min_lon) | Q(longitude__lte=max_lon - 360))
+    return box & Q(longitude__gte=min_lon, longitude__lte=max_lon)
+
+
+def haversine_km(latitude, longitude):
+    # Great-circle distance in km from the origin to each row's latitude/longitude, as a
+    # database expression (Django provides these math functions on SQLite too)
+    lat1 = Radians(Value(latitude, output_field=FloatField()))
+    lat2 = Radians(F("latitude"))
+    half_dlat = (lat2 - lat1) / 2
+    half_dlon = Radians(F("longitude") - Value(longitude, output_field=FloatField())) / 2
+    a = Power(Sin(half_dlat), 2) + Cos(lat1) * Cos(lat2) * Power(Sin(half_dlon), 2)
+    # Rounding can push `a` a hair above 1, which is outside ASIN's domain
+    return 2 * EARTH_RADIUS_KM * ASin(Sqrt(Least(a, Value(1.0, output_field=FloatField()))))
+
+
+def nearby(queryset, latitude, longitude, radius_km):
+    # Rows of `queryset` within radius_km of the origin, annotated with distance_km and
+    # sorted nearest first
+    return (
+        queryset.filter(bounding_box(latitude, longitude, radius_km))
+        .annotate(distance_km=haversine_km(latitude, longitude))
+        .filter(distance_km__lte=radius_km)
+        .order_by("distance_km", "id")
+    )
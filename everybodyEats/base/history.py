@@ -0,0 +1,84 @@
+import heapq
+
+from .models import ArchivedFoodClaim, FoodClaim
+
+# Claim histories span two tables: archive_food_listings moves the claims of old closed
+# listings from FoodClaim to ArchivedFoodClaim (keeping their ids), and the history
+# endpoints and exports have to keep showing them.
+
+
+def claim_history(**filters):
+    # Live and archived claims matching `filters`; the lookups must exist on both models
+    return MergedQuerySet([FoodClaim.objects.filter(**filters), ArchivedFoodClaim.objects.filter(**filters)])
+
+
+class MergedQuerySet:
+    """
+    The rows of several querysets with the same columns, merged in their common ordering.
+
+    Supports what the cursor paginator and the exports use: filter(), order_by(),
+    values(), values_list(), slicing from the start and iterator(). Each queryset is read
+    in its own (indexed) order and the results are merged in Python, so nothing is sorted
+    across the tables in the database.
+    """
+
+    def __init__(self, querysets, ordering=(), fields=None):
+        self.querysets = querysets
+        self.ordering = ordering
+        # values_list() column names, to find the ordering fields in tuple rows
+        self.fields = fields
+
+    def _clone(self, method, *args, **kwargs):
+        return MergedQuerySet(
+            [getattr(queryset, method)(*args, **kwargs) for queryset in self.querysets], self.ordering, self.fields
+        )
+
+    def filter(self, *args, **kwargs):
+        return self._clone("filter", *args, **kwargs)
+
+    def values(self, *fields):
+        return self._clone("values", *fields)
+
+    def values_list(self, *fields):
+        merged = self._clone("values_list", *fields)
+        merged.fields = fields
+        return merged
+
+    def order_by(self, *ordering):
+        # One direction for every field, as in the cursor orderings
+        if len({field.startswith("-") for field in ordering}) > 1:
+            raise ValueError("MergedQuerySet can't merge on mixed ordering directions.")
+        merged = self._clone("order_by", *ordering)
+        merged.ordering = ordering
+        return merged
+
+    def _merge(self, iterables):
+        names = [field.lstrip("-") for field in self.ordering]
+        if self.fields is not None:
+            positions = [self.fields.index(name) for name in names]
+        else:
+            positions = names
+
+        def key(row):
+            # NULLs sort below every value (last when descending)
+            return tuple((row[position] is not None, row[position]) for position in positions)
+
+        descending = bool(self.ordering) and self.ordering[0].startswith("-")
+        return heapq.merge(*iterables, key=key, reverse=descending)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None or index.stop is None:
+            raise TypeError("MergedQuerySet only supports slices with an end.")
+        start = index.start or 0
+        # The first `stop` merged rows come from the first `stop` rows of each queryset
+        rows = self._merge([list(queryset[: index.stop]) for queryset in self.querysets])
+        return list(rows)[start: index.stop]
+
+    def iterator(self, chunk_size=None):
+        iterators = [queryset.iterator(chunk_size=chunk_size) for queryset in self.querysets]
+        try:
+            yield from self._merge(iterators)
+        finally:
+            # Release each database cursor when the merged iterator is closed early
+            for iterator in iterators:
+                iterator.close()
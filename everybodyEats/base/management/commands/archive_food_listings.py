@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from base.cache import invalidate_model
+from base.models import (
+    CLOSED_LISTING_STATUSES,
+    ArchivedFoodClaim,
+    ArchivedFoodListing,
+    FoodClaim,
+    FoodListing,
+)
+
+
+def copied_fields(archive_model):
+    # Columns the archive table shares with the live one (everything but archived_at)
+    return [field.attname for field in archive_model._meta.concrete_fields if field.name != "archived_at"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Move claimed and expired food listings older than --days, together with their "
+        "claims, into the archive tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=90,
+            help="Archive closed listings created more than this many days ago.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of listings moved per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] < 1:
+            raise CommandError("--days must be at least 1.")
+
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        closed = FoodListing.objects.filter(status__in=CLOSED_LISTING_STATUSES, created_at__lt=cutoff)
+        listing_fields = copied_fields(ArchivedFoodListing)
+        claim_fields = copied_fields(ArchivedFoodClaim)
+
+        archived = 0
+        while True:
+            # Copy one batch and its claims, then delete the originals, in one transaction
+            with transaction.atomic():
+                listing_ids = list(
+                    closed.select_for_update(skip_locked=True).order_by("id").values_list("id", flat=True)[
+                        : options["batch_size"]
+                    ]
+                )
+                if not listing_ids:
+                    break
+
+                ArchivedFoodListing.objects.bulk_create(
+                    ArchivedFoodListing(**row)
+                    for row in FoodListing.objects.filter(pk__in=listing_ids).values(*listing_fields)
+                )
+                claims = FoodClaim.objects.filter(food_listing_id__in=listing_ids)
+                ArchivedFoodClaim.objects.bulk_create(
+                    ArchivedFoodClaim(**row) for row in claims.values(*claim_fields)
+                )
+                claims.delete()
+                FoodListing.objects.filter(pk__in=listing_ids).delete()
+            archived += len(listing_ids)
+
+        if archived:
+            invalidate_model(FoodListing)
+            invalidate_model(FoodClaim)
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} food listing(s)."))
@@ -0,0 +1,40 @@
+from django.core.signals import request_finished, request_started
+from django.db import connection
+
+from base.benchmarks import BenchmarkCommand, time_calls
+from base.models import CLOSED_LISTING_STATUSES, FoodListing
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Time a request's database work with connections closed after every request "
+        "(DB_CONN_MAX_AGE=0) and kept open between requests (DB_CONN_MAX_AGE=60). Each "
+        "run sends the request signals, which is where Django closes old connections."
+    )
+    default_iterations = 500
+
+    def handle(self, *args, **options):
+        def request():
+            request_started.send(sender=self.__class__)
+            # The first page of the default food listings feed
+            list(
+                FoodListing.objects.exclude(status__in=CLOSED_LISTING_STATUSES)
+                .order_by("-created_at", "-id")
+                .values_list("id", flat=True)[:20]
+            )
+            request_finished.send(sender=self.__class__)
+
+        settings_dict = connection.settings_dict
+        configured = settings_dict["CONN_MAX_AGE"]
+        self.stdout.write(
+            f"{connection.vendor} database {settings_dict['NAME']}, configured DB_CONN_MAX_AGE={configured}"
+        )
+        try:
+            for max_age in (0, 60):
+                # The lifetime is read when a connection opens
+                connection.close()
+                settings_dict["CONN_MAX_AGE"] = max_age
+                self.report(f"DB_CONN_MAX_AGE={max_age}", time_calls(request, options["iterations"]))
+        finally:
+            connection.close()
+            settings_dict["CONN_MAX_AGE"] = configured
@@ -0,0 +1,78 @@
+import random
+
+from django.db import connection
+from django.db.models import Q
+
+from base.benchmarks import BenchmarkCommand, rolled_back, time_calls
+from base.models import CLOSED_LISTING_STATUSES, FoodListing, Restaurant
+from base.search import search_food_listings
+
+FOOD_WORDS = (
+    "rice", "curry", "bread", "soup", "salad", "pasta", "chicken", "beans", "lentils", "noodles",
+    "pizza", "bagels", "muffins", "apples", "bananas", "yogurt", "sandwiches", "tacos", "stew", "dumplings",
+)
+INSTRUCTION_WORDS = (
+    "keep", "refrigerated", "contains", "nuts", "dairy", "vegan", "halal", "bring", "containers",
+    "use", "by", "tonight", "back", "door", "ask", "for", "the", "manager", "frozen", "spicy",
+)
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Seed food listings and compare the ranked ?q= search with an icontains scan over "
+        "the same live listings. The seeded rows are rolled back."
+    )
+    default_iterations = 100
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument("--listings", type=int, default=100_000, help="Listings to seed (default 100000).")
+        parser.add_argument("--query", default="curry", help='Search text (default "curry").')
+
+    def handle(self, *args, **options):
+        query = options["query"]
+        with rolled_back():
+            self.seed(options["listings"])
+            live = FoodListing.objects.exclude(status__in=CLOSED_LISTING_STATUSES)
+
+            def search():
+                return list(search_food_listings(live, query).values_list("id", flat=True)[:20])
+
+            def icontains():
+                return list(
+                    live.filter(Q(food_name__icontains=query) | Q(special_instructions__icontains=query))
+                    .order_by("-created_at", "-id")
+                    .values_list("id", flat=True)[:20]
+                )
+
+            self.stdout.write(
+                f"{FoodListing.objects.count()} listings on {connection.vendor}, "
+                f"{search_food_listings(live, query).count()} match {query!r}"
+            )
+            self.report("ranked search (?q=)", time_calls(search, options["iterations"]))
+            self.report("icontains", time_calls(icontains, options["iterations"]))
+
+    def seed(self, count):
+        rng = random.Random(0)
+        restaurant = Restaurant.objects.create(name="Benchmark", address="1 Main St", email="bench@example.com", phone="1")
+        batch = []
+        for _ in range(count):
+            total = rng.randint(1, 50)
+            batch.append(FoodListing(
+                restaurant=restaurant,
+                food_name=" ".join(rng.sample(FOOD_WORDS, 2)),
+                special_instructions=" ".join(rng.choices(INSTRUCTION_WORDS, k=8)),
+                total_quantity=total,
+                remaining_quantity=total,
+                available_pickup_times="5pm",
+                pickup_address="1 Main St",
+                # Two in five are closed (claimed or expired), which the search has to skip
+                status=rng.choice(("available", "available", "partially claimed", "claimed", "expired")),
+            ))
+            if len(batch) == 5000:
+                FoodListing.objects.bulk_create(batch)
+                batch = []
+        FoodListing.objects.bulk_create(batch)
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE base_foodlisting")
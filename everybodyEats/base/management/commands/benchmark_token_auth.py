@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import override_settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from base.authentication import CachedTokenAuthentication, forget_token
+from base.benchmarks import BenchmarkCommand, rolled_back, time_calls
+
+
+class Command(BenchmarkCommand):
+    help = (
+        "Time token authentication of one request with DRF's TokenAuthentication and with "
+        "CachedTokenAuthentication, cold and warm, against the configured database and cache."
+    )
+    default_iterations = 1000
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            user = User.objects.create_user(username="benchmark-token-auth")
+            key = Token.objects.create(user=user).key
+            request = Request(APIRequestFactory().get("/", HTTP_AUTHORIZATION=f"Token {key}"))
+
+            def authenticate(authentication):
+                return lambda: authentication.authenticate(request)
+
+            def cold():
+                forget_token(key)
+                CachedTokenAuthentication().authenticate(request)
+
+            self.stdout.write(f"cache backend: {settings.CACHES['default']['BACKEND']}")
+            self.report("TokenAuthentication", time_calls(authenticate(TokenAuthentication()), options["iterations"]))
+            with override_settings(AUTH_TOKEN_CACHE_TTL=300):
+                self.report("cached, miss", time_calls(cold, options["iterations"]))
+                self.report(
+                    "cached, hit", time_calls(authenticate(CachedTokenAuthentication()), options["iterations"])
+                )
+            forget_token(key)
@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from base.models import FoodClaim
+from base.partitions import create_partitions, is_partitioned, partition_food_claims
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the monthly food claim partitions up to --months-ahead months from now "
+        "(PostgreSQL with FOOD_CLAIM_PARTITIONING only). Meant to be run periodically "
+        "(e.g. daily from cron) so new claims never land in the default partition."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.FOOD_CLAIM_PARTITION_MONTHS_AHEAD,
+            help="Number of future months to keep partitions for.",
+        )
+        parser.add_argument(
+            "--convert",
+            action="store_true",
+            help="Partition the claims table first if it isn't yet. Rewrites the whole table.",
+        )
+
+    def handle(self, *args, **options):
+        if options["months_ahead"] < 0:
+            raise CommandError("--months-ahead can't be negative.")
+        if connection.vendor != "postgresql":
+            self.stdout.write("Claim partitioning needs PostgreSQL; nothing to do.")
+            return
+
+        # One transaction, so a failed conversion leaves the table as it was
+        with connection.schema_editor() as schema_editor:
+            if not is_partitioned(connection):
+                if not options["convert"]:
+                    self.stdout.write(
+                        "The claims table isn't partitioned; run with --convert to partition it."
+                    )
+                    return
+                partition_food_claims(schema_editor, FoodClaim, options["months_ahead"])
+                self.stdout.write("Partitioned the claims table.")
+            created = create_partitions(schema_editor, options["months_ahead"])
+
+        self.stdout.write(self.style.SUCCESS(f"Created {created} claim partition(s)."))
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from base.cache import invalidate_model
+from base.models import CLOSED_LISTING_STATUSES, FoodListing
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark live food listings whose pickup window has ended as expired, in batches. "
+        "Meant to be run periodically (e.g. every few minutes from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of listings expired per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        due = FoodListing.objects.filter(pickup_window_end__lte=now).exclude(
+            status__in=CLOSED_LISTING_STATUSES
+        )
+
+        expired = 0
+        while True:
+            # Lock one batch (skipping listings that are being claimed right now; the next
+            # run picks them up) and flip their status with a single UPDATE
+            with transaction.atomic():
+                listing_ids = list(
+                    due.select_for_update(skip_locked=True)
+                    .order_by("pickup_window_end", "id")
+                    .values_list("id", flat=True)[: options["batch_size"]]
+                )
+                if not listing_ids:
+                    break
+                FoodListing.objects.filter(pk__in=listing_ids).update(status="expired")
+            expired += len(listing_ids)
+
+        if expired:
+            # update() sends no signals, so drop the cached responses showing these listings
+            invalidate_model(FoodListing)
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} food listing(s)."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from base.geo import GeocoderUnavailable, geocode_rows
+from base.models import CLOSED_LISTING_STATUSES, FoodListing, Restaurant
+
+
+class Command(BaseCommand):
+    help = (
+        "Geocode the addresses of restaurants and live food listings that are still pending "
+        "or have no latitude/longitude, using the configured geocoder."
+    )
+
+    def handle(self, *args, **options):
+        missing = Q(location_pending=True) | Q(latitude__isnull=True)
+        try:
+            # Restaurants first, so listings that can't be geocoded can fall back to them
+            restaurants = geocode_rows(Restaurant.objects.filter(missing), "address")
+            listings = geocode_rows(
+                FoodListing.objects.filter(missing).exclude(status__in=CLOSED_LISTING_STATUSES),
+                "pickup_address",
+                ("restaurant__latitude", "restaurant__longitude"),
+            )
+        except GeocoderUnavailable as exc:
+            self.stderr.write(f"{exc}; the remaining addresses stay pending.")
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Located {restaurants} restaurant(s) and {listings} food listing(s).")
+        )
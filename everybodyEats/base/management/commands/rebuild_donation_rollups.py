@@ -0,0 +1,72 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+from base.cache import invalidate_model
+from base.models import ArchivedFoodClaim, DonationDailyRollup, FoodClaim
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DonationDailyRollup statistics table from the live and archived claims."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rollup rows inserted per query.",
+        )
+
+    def handle(self, *args, **options):
+        table = connection.ops.quote_name(DonationDailyRollup._meta.db_table)
+        # Swap the table contents in one transaction so the stats endpoints never see a
+        # half-built rollup, with the rollup locked against writers before the claims are
+        # read: a claim that commits in between would otherwise be missed
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                if connection.vendor == "postgresql":
+                    # Claims wait to increment the rollup until the commit. Taking the lock
+                    # waits for claims that already hold a rollup row, so the read below
+                    # sees them
+                    cursor.execute(f"LOCK TABLE {table} IN EXCLUSIVE MODE")
+                # A plain DELETE: the cache invalidation receivers would make
+                # queryset.delete() load every row. On SQLite this write also takes the
+                # database lock, which keeps claims out until the commit
+                cursor.execute(f"DELETE FROM {table}")
+
+            # One row per (day, restaurant), grouped in the database for the live and the
+            # archived claims and then added together. A single UNION ALL query, so a
+            # batch moved by archive_food_listings is counted exactly once
+            claims_counts, quantities = Counter(), Counter()
+            grouped = [
+                model.objects.filter(claimed_at__isnull=False)
+                .annotate(day=TruncDate("claimed_at"))
+                .values("day", "food_listing__restaurant")
+                .annotate(claims_count=Count("id"), quantity=Sum("claimed_quantity"))
+                .order_by()
+                for model in (FoodClaim, ArchivedFoodClaim)
+            ]
+            for row in grouped[0].union(grouped[1], all=True).iterator():
+                key = row["day"], row["food_listing__restaurant"]
+                claims_counts[key] += row["claims_count"]
+                quantities[key] += row["quantity"]
+
+            created = DonationDailyRollup.objects.bulk_create(
+                [
+                    DonationDailyRollup(
+                        day=day,
+                        restaurant_id=restaurant_id,
+                        claims_count=claims_count,
+                        quantity=quantities[day, restaurant_id],
+                    )
+                    for (day, restaurant_id), claims_count in claims_counts.items()
+                ],
+                batch_size=options["batch_size"],
+            )
+            # Neither the DELETE nor bulk_create sends signals
+            invalidate_model(DonationDailyRollup)
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(created)} daily donation rollup row(s)."))
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from base.cache import invalidate_model
+from base.models import FoodClaim, FoodListing
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the denormalized claimed/remaining quantity counters on "
+        "FoodListing from the FoodClaim rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only report listings whose counters disagree with their claims; exit non-zero if any do.",
+        )
+
+    def handle(self, *args, **options):
+        # Total claimed per listing, computed in the database as a correlated subquery
+        claimed = Coalesce(
+            Subquery(
+                FoodClaim.objects.filter(food_listing=OuterRef("pk"))
+                .values("food_listing")
+                .annotate(total=Sum("claimed_quantity"))
+                .values("total")
+            ),
+            0,
+        )
+        expected_remaining = Greatest(F("total_quantity") - claimed, 0)
+
+        if options["check"]:
+            mismatched = (
+                FoodListing.objects.annotate(
+                    actual_claimed=claimed, actual_remaining=expected_remaining
+                )
+                .filter(
+                    ~Q(claimed_quantity=F("actual_claimed"))
+                    | ~Q(remaining_quantity=F("actual_remaining"))
+                )
+                .values_list(
+                    "id",
+                    "claimed_quantity",
+                    "actual_claimed",
+                    "remaining_quantity",
+                    "actual_remaining",
+                )
+            )
+            count = 0
+            for listing_id, stored_claimed, actual_claimed, stored_remaining, actual_remaining in mismatched.iterator():
+                count += 1
+                self.stdout.write(
+                    f"FoodListing {listing_id}: claimed {stored_claimed} (expected {actual_claimed}), "
+                    f"remaining {stored_remaining} (expected {actual_remaining})"
+                )
+            if count:
+                raise CommandError(f"{count} food listing(s) have out-of-sync claim counters.")
+            self.stdout.write(self.style.SUCCESS("All food listing claim counters are in sync."))
+            return
+
+        updated = FoodListing.objects.update(
+            claimed_quantity=claimed, remaining_quantity=expected_remaining
+        )
+        # update() sends no signals, so drop the cached responses showing the old counters
+        invalidate_model(FoodListing)
+        self.stdout.write(self.style.SUCCESS(f"Recomputed claim counters for {updated} food listing(s)."))
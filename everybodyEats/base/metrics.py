@@ -0,0 +1,249 @@
+import contextvars
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+# Per-view request metrics: SQL query count, time in the database, serialization time
+# (serializers building the response data and the renderer encoding it) and total time. Each response carries them in a Server-Timing header,
+# /api/metrics/ serves them as Prometheus histograms, and a request running more than
+# QUERY_COUNT_LOG_THRESHOLD queries has its SQL logged. Streaming responses are recorded
+# once their body has been sent. The histograms live in process memory, so with several
+# workers each scrape sees the worker that answered it.
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+# name: (help text, buckets)
+HISTOGRAMS = {
+    "everybodyeats_request_duration_seconds": ("Total time spent handling the request.", DURATION_BUCKETS),
+    "everybodyeats_request_db_seconds": ("Time spent running SQL queries.", DURATION_BUCKETS),
+    "everybodyeats_request_serialization_seconds": ("Time spent building and encoding the response body.", DURATION_BUCKETS),
+    "everybodyeats_request_queries": ("Number of SQL queries run.", QUERY_COUNT_BUCKETS),
+}
+
+STANDARD_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+current_request = contextvars.ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self, keep_sql):
+        self.started = perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.serializing = False
+        self.sql = [] if keep_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook, called for every query
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - started
+            self.queries += 1
+            if self.sql is not None:
+                self.sql.append(sql)
+
+
+@contextmanager
+def timed_serialization():
+    # Counts the enclosed work as serialization time of the current request, if any.
+    # Queries run inside (lazy relations, querysets evaluated by a serializer) only count
+    # as database time, and nested blocks are counted once
+    metrics = current_request.get()
+    if metrics is None or metrics.serializing:
+        yield
+        return
+    metrics.serializing = True
+    started = perf_counter()
+    db_time = metrics.db_time
+    try:
+        yield
+    finally:
+        metrics.serializing = False
+        metrics.serialization_time += perf_counter() - started - (metrics.db_time - db_time)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Per-bucket counts (not cumulative); the last one is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, view, method, values):
+        with self._lock:
+            for name, value in values.items():
+                key = (name, view, method)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(HISTOGRAMS[name][1])
+                histogram.observe(value)
+
+    def render(self):
+        # Prometheus text exposition format
+        with self._lock:
+            series = sorted(
+                (key, list(histogram.counts), histogram.sum, histogram.count)
+                for key, histogram in self._histograms.items()
+            )
+        lines = []
+        for name, (help_text, buckets) in HISTOGRAMS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (series_name, view, method), counts, total, count in series:
+                if series_name != name:
+                    continue
+                labels = f'view="{escape_label(view)}",method="{escape_label(method)}"'
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {total!r}")
+                lines.append(f"{name}_count{{{labels}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def escape_label(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+registry = MetricsRegistry()
+
+
+def watch_queries(metrics):
+    # Enter connection.execute_wrapper for this thread's connection; the caller exits it
+    # from the same thread
+    watcher = connection.execute_wrapper(metrics)
+    watcher.__enter__()
+    return watcher
+
+
+class RequestMetricsMiddleware:
+    """
+    Records query count, DB time, serialization time and total time per view. Goes first
+    in MIDDLEWARE so the figures cover the whole stack (sessions, auth, the view).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics = RequestMetrics(keep_sql=settings.QUERY_COUNT_LOG_THRESHOLD > 0)
+        token = current_request.set(metrics)
+        try:
+            with connection.execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics(keep_sql=settings.QUERY_COUNT_LOG_THRESHOLD > 0)
+        token = current_request.set(metrics)
+        # Connections are per thread. Async views and the async ORM run their queries in
+        # the request's thread-sensitive executor thread, so the wrapper goes on that
+        # thread's connection
+        watcher = await sync_to_async(watch_queries)(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(watcher.__exit__)(None, None, None)
+            current_request.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        if settings.METRICS_SERVER_TIMING:
+            # For streaming responses this covers the work done before the body starts
+            response["Server-Timing"] = (
+                f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.queries} queries", '
+                f"serialize;dur={metrics.serialization_time * 1000:.2f}, "
+                f"total;dur={(perf_counter() - metrics.started) * 1000:.2f}"
+            )
+
+        if response.streaming:
+            # Streaming bodies (the exports) run their queries while they are sent, after the
+            # view has returned, so watch those too and record the request once the body is
+            # done. Its duration then includes sending the body
+            if response.is_async:
+                response.streaming_content = self.watch_async_stream(request, response.streaming_content, metrics)
+            else:
+                response.streaming_content = self.watch_stream(request, response.streaming_content, metrics)
+        else:
+            self.record(request, metrics)
+        return response
+
+    def watch_stream(self, request, content, metrics):
+        try:
+            # Entered in whichever thread consumes the body, which is where it queries
+            with connection.execute_wrapper(metrics):
+                yield from content
+        finally:
+            self.record(request, metrics)
+
+    async def watch_async_stream(self, request, content, metrics):
+        watcher = await sync_to_async(watch_queries)(metrics)
+        try:
+            async for chunk in content:
+                yield chunk
+        finally:
+            await sync_to_async(watcher.__exit__)(None, None, None)
+            self.record(request, metrics)
+
+    def record(self, request, metrics):
+        total = perf_counter() - metrics.started
+        match = request.resolver_match
+        # Unresolved paths share one label so 404 probes don't create new series
+        view = match.view_name if match else "unmatched"
+        method = request.method if request.method in STANDARD_METHODS else "other"
+        registry.observe(view, method, {
+            "everybodyeats_request_duration_seconds": total,
+            "everybodyeats_request_db_seconds": metrics.db_time,
+            "everybodyeats_request_serialization_seconds": metrics.serialization_time,
+            "everybodyeats_request_queries": metrics.queries,
+        })
+
+        threshold = settings.QUERY_COUNT_LOG_THRESHOLD
+        if threshold > 0 and metrics.queries > threshold:
+            logger.warning(
+                "%s %s (%s) ran %d queries (%.1f ms in the database):\n%s",
+                request.method,
+                request.path,
+                view,
+                metrics.queries,
+                metrics.db_time * 1000,
+                "\n".join(metrics.sql),
+            )
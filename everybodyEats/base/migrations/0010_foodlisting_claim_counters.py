@@ -0,0 +1,46 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:01
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+
+def backfill_claim_counters(apps, schema_editor):
+    FoodClaim = apps.get_model('base', 'FoodClaim')
+    FoodListing = apps.get_model('base', 'FoodListing')
+
+    claimed = Coalesce(
+        Subquery(
+            FoodClaim.objects.filter(food_listing=OuterRef('pk'))
+            .values('food_listing')
+            .annotate(total=Sum('claimed_quantity'))
+            .values('total')
+        ),
+        0,
+    )
+    FoodListing.objects.update(
+        claimed_quantity=claimed,
+        # Listings over-claimed before the counters existed bottom out at zero
+        remaining_quantity=Greatest(F('total_quantity') - claimed, 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0009_rename_created_at_foodclaim_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodlisting',
+            name='claimed_quantity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='foodlisting',
+            name='remaining_quantity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_claim_counters, migrations.RunPython.noop),
+    ]
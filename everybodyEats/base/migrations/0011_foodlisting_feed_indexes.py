@@ -0,0 +1,25 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_foodlisting_claim_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='foodlisting',
+            index=models.Index(condition=models.Q(('status', 'claimed'), _negated=True), fields=['-created_at', '-id'], name='foodlisting_live_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='foodlisting',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='foodlisting_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='foodlisting',
+            index=models.Index(fields=['restaurant', '-created_at', '-id'], name='foodlisting_rest_created_idx'),
+        ),
+    ]
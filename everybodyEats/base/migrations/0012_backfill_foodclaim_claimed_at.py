@@ -0,0 +1,28 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:20
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_claimed_at(apps, schema_editor):
+    # Claims created before claimed_at existed have no timestamp; fall back to their
+    # listing's creation time so the claim history can be cursor-paginated by claimed_at
+    FoodClaim = apps.get_model('base', 'FoodClaim')
+    FoodListing = apps.get_model('base', 'FoodListing')
+
+    FoodClaim.objects.filter(claimed_at__isnull=True).update(
+        claimed_at=Subquery(
+            FoodListing.objects.filter(pk=OuterRef('food_listing_id')).values('created_at')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0011_foodlisting_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_claimed_at, migrations.RunPython.noop),
+    ]
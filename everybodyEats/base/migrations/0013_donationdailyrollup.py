@@ -0,0 +1,56 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:04
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def build_rollups(apps, schema_editor):
+    FoodClaim = apps.get_model('base', 'FoodClaim')
+    DonationDailyRollup = apps.get_model('base', 'DonationDailyRollup')
+
+    rows = (
+        FoodClaim.objects.filter(claimed_at__isnull=False)
+        .annotate(day=TruncDate('claimed_at'))
+        .values('day', 'food_listing__restaurant')
+        .annotate(claims_count=Count('id'), quantity=Sum('claimed_quantity'))
+        .order_by()
+    )
+    DonationDailyRollup.objects.bulk_create(
+        [
+            DonationDailyRollup(
+                day=row['day'],
+                restaurant_id=row['food_listing__restaurant'],
+                claims_count=row['claims_count'],
+                quantity=row['quantity'],
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0012_backfill_foodclaim_claimed_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DonationDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('claims_count', models.PositiveIntegerField(default=0)),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('restaurant', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='base.restaurant')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='donationdailyrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'restaurant'), name='unique_rollup_day_restaurant'),
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0013_donationdailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='foodclaim',
+            index=models.Index(fields=['ngo', '-claimed_at', '-id'], name='foodclaim_ngo_claimed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='foodclaim',
+            index=models.Index(fields=['food_listing', '-claimed_at', '-id'], name='foodclaim_listing_claimed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='foodclaim',
+            index=models.Index(fields=['-claimed_at', '-id'], name='foodclaim_claimed_idx'),
+        ),
+    ]
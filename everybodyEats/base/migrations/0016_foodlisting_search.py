@@ -0,0 +1,73 @@
+from django.db import migrations
+
+# Text search over food_name and special_instructions (see base/search.py).
+# PostgreSQL: a GIN index over the weighted tsvector expression, for listings that are not
+# fully claimed. The expression must stay identical to base.search.SEARCH_DOCUMENT_SQL.
+# SQLite: an external-content FTS5 table kept in sync by triggers. Django rebuilds SQLite
+# tables for some schema changes, which drops the triggers, so a later migration that
+# does that to base_foodlisting has to run create_sqlite_search again.
+
+SEARCH_DOCUMENT_SQL = (
+    "(setweight(to_tsvector('english'::regconfig, COALESCE(food_name, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, COALESCE(special_instructions, '')), 'B'))"
+)
+
+SQLITE_SEARCH_TABLE = 'base_foodlisting_fts'
+
+
+def create_sqlite_search(schema_editor):
+    for statement in [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_SEARCH_TABLE} USING fts5("
+        "food_name, special_instructions, content='base_foodlisting', content_rowid='id', "
+        "tokenize='porter unicode61')",
+        f"DROP TRIGGER IF EXISTS {SQLITE_SEARCH_TABLE}_insert",
+        f"DROP TRIGGER IF EXISTS {SQLITE_SEARCH_TABLE}_delete",
+        f"DROP TRIGGER IF EXISTS {SQLITE_SEARCH_TABLE}_update",
+        f"CREATE TRIGGER {SQLITE_SEARCH_TABLE}_insert AFTER INSERT ON base_foodlisting BEGIN "
+        f"INSERT INTO {SQLITE_SEARCH_TABLE}(rowid, food_name, special_instructions) "
+        "VALUES (new.id, new.food_name, new.special_instructions); END",
+        f"CREATE TRIGGER {SQLITE_SEARCH_TABLE}_delete AFTER DELETE ON base_foodlisting BEGIN "
+        f"INSERT INTO {SQLITE_SEARCH_TABLE}({SQLITE_SEARCH_TABLE}, rowid, food_name, special_instructions) "
+        "VALUES ('delete', old.id, old.food_name, old.special_instructions); END",
+        f"CREATE TRIGGER {SQLITE_SEARCH_TABLE}_update AFTER UPDATE OF food_name, special_instructions "
+        f"ON base_foodlisting BEGIN "
+        f"INSERT INTO {SQLITE_SEARCH_TABLE}({SQLITE_SEARCH_TABLE}, rowid, food_name, special_instructions) "
+        "VALUES ('delete', old.id, old.food_name, old.special_instructions); "
+        f"INSERT INTO {SQLITE_SEARCH_TABLE}(rowid, food_name, special_instructions) "
+        "VALUES (new.id, new.food_name, new.special_instructions); END",
+        # Index the listings that already exist
+        f"INSERT INTO {SQLITE_SEARCH_TABLE}({SQLITE_SEARCH_TABLE}) VALUES ('rebuild')",
+    ]:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS foodlisting_search_idx ON base_foodlisting "
+            f"USING gin ({SEARCH_DOCUMENT_SQL}) WHERE NOT (status = 'claimed')"
+        )
+    elif vendor == 'sqlite':
+        create_sqlite_search(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS foodlisting_search_idx")
+    elif vendor == 'sqlite':
+        for suffix in ('insert', 'delete', 'update'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {SQLITE_SEARCH_TABLE}_{suffix}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {SQLITE_SEARCH_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0015_geo_coordinates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
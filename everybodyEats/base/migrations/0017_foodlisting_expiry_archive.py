@@ -0,0 +1,103 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+SEARCH_DOCUMENT_SQL = (
+    "(setweight(to_tsvector('english'::regconfig, COALESCE(food_name, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, COALESCE(special_instructions, '')), 'B'))"
+)
+
+
+def recreate_search_index(predicate):
+    # The PostgreSQL search index from 0016 covers the live listings, which now also
+    # excludes expired ones
+    def recreate(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        schema_editor.execute("DROP INDEX IF EXISTS foodlisting_search_idx")
+        schema_editor.execute(
+            f"CREATE INDEX foodlisting_search_idx ON base_foodlisting "
+            f"USING gin ({SEARCH_DOCUMENT_SQL}) WHERE {predicate}"
+        )
+    return recreate
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0016_foodlisting_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedFoodClaim',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('claimed_quantity', models.PositiveIntegerField()),
+                ('claimed_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedFoodListing',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('food_name', models.CharField(max_length=100)),
+                ('total_quantity', models.PositiveIntegerField()),
+                ('available_pickup_times', models.CharField(max_length=100)),
+                ('pickup_address', models.CharField(max_length=255)),
+                ('special_instructions', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('status', models.CharField(max_length=20)),
+                ('pickup_window_end', models.DateTimeField(blank=True, null=True)),
+                ('claimed_quantity', models.PositiveIntegerField(default=0)),
+                ('remaining_quantity', models.PositiveIntegerField(default=0)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='foodlisting',
+            name='foodlisting_live_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='foodlisting',
+            name='foodlisting_live_geo_idx',
+        ),
+        migrations.AddField(
+            model_name='foodlisting',
+            name='pickup_window_end',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='foodlisting',
+            index=models.Index(condition=models.Q(('status__in', ('claimed', 'expired')), _negated=True), fields=['-created_at', '-id'], name='foodlisting_live_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='foodlisting',
+            index=models.Index(condition=models.Q(('status__in', ('claimed', 'expired')), _negated=True), fields=['latitude', 'longitude'], name='foodlisting_live_geo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='foodlisting',
+            index=models.Index(condition=models.Q(('status__in', ('claimed', 'expired')), _negated=True), fields=['pickup_window_end'], name='foodlisting_live_expiry_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedfoodlisting',
+            name='restaurant',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_food_listings', to='base.restaurant'),
+        ),
+        migrations.AddField(
+            model_name='archivedfoodclaim',
+            name='food_listing',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='claims', to='base.archivedfoodlisting'),
+        ),
+        migrations.AddField(
+            model_name='archivedfoodclaim',
+            name='ngo',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_claims', to='base.ngo'),
+        ),
+        migrations.RunPython(
+            recreate_search_index("NOT (status IN ('claimed', 'expired'))"),
+            recreate_search_index("NOT (status = 'claimed')"),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db import migrations
+
+from base.partitions import is_partitioned, partition_food_claims, unpartition_food_claims
+
+# Opt-in: with FOOD_CLAIM_PARTITIONING enabled on PostgreSQL, base_foodclaim becomes a
+# table range-partitioned by month on claimed_at (see base/partitions.py). Everywhere else
+# this is a no-op; the table can also be converted later with
+# `python manage.py create_claim_partitions --convert`.
+
+
+def partition(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or not settings.FOOD_CLAIM_PARTITIONING:
+        return
+    if not is_partitioned(connection):
+        partition_food_claims(
+            schema_editor, apps.get_model('base', 'FoodClaim'), settings.FOOD_CLAIM_PARTITION_MONTHS_AHEAD
+        )
+
+
+def unpartition(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql' and is_partitioned(connection):
+        unpartition_food_claims(schema_editor, apps.get_model('base', 'FoodClaim'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0017_foodlisting_expiry_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
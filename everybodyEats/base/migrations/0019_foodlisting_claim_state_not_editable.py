@@ -0,0 +1,28 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0018_foodclaim_partitioning'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='foodlisting',
+            name='claimed_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='foodlisting',
+            name='remaining_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='foodlisting',
+            name='status',
+            field=models.CharField(default='available', editable=False, max_length=20),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0019_foodlisting_claim_state_not_editable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='foodlisting',
+            name='location_pending',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='location_pending',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
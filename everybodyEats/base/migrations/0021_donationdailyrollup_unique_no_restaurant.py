@@ -0,0 +1,34 @@
+# Generated by Django 4.2.16 on 2026-10-18 12:43
+
+from django.db import migrations, models
+from django.db.models import Min, Sum
+
+
+def merge_duplicate_rows(apps, schema_editor):
+    # Concurrent claims on listings without a restaurant could create several rows for the
+    # same day; fold them into one before the constraint is added
+    DonationDailyRollup = apps.get_model('base', 'DonationDailyRollup')
+    duplicates = (
+        DonationDailyRollup.objects.filter(restaurant__isnull=True)
+        .values('day')
+        .annotate(rows=models.Count('id'), keep=Min('id'), claims=Sum('claims_count'), total=Sum('quantity'))
+        .filter(rows__gt=1)
+    )
+    for row in duplicates:
+        DonationDailyRollup.objects.filter(pk=row['keep']).update(claims_count=row['claims'], quantity=row['total'])
+        DonationDailyRollup.objects.filter(day=row['day'], restaurant__isnull=True).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0020_location_pending'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='donationdailyrollup',
+            constraint=models.UniqueConstraint(condition=models.Q(('restaurant__isnull', True)), fields=('day',), name='unique_rollup_day_no_restaurant'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from importlib import import_module
+
+from django.db import migrations
+
+# Adding location_pending in 0020 made Django rebuild base_foodlisting on SQLite, which
+# dropped the FTS5 triggers from 0016. Create them again and reindex the listings saved
+# in between.
+search_migration = import_module('base.migrations.0016_foodlisting_search')
+
+
+def restore_sqlite_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        search_migration.create_sqlite_search(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0021_donationdailyrollup_unique_no_restaurant'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_sqlite_search, migrations.RunPython.noop),
+    ]
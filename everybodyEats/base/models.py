@@ -1,5 +1,16 @@
 from django.contrib.auth.models import User
-from django.db import models
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+# Listings in these statuses are no longer offered. The feed, its partial indexes and the
+# claim path only look at the other ("live") listings
+CLOSED_LISTING_STATUSES = ('claimed', 'expired')
+
+# Maintained by apply_claim() and the expiry job, never written from a listing instance
+CLAIM_STATE_FIELDS = ('claimed_quantity', 'remaining_quantity', 'status')
 
 
 # Model to track claims by NGOs
@@ -9,6 +20,16 @@ class FoodClaim(models.Model):
     claimed_quantity = models.PositiveIntegerField()  # How much of the food the NGO claimed
     claimed_at = models.DateTimeField(auto_now_add=True, null=True)
 
+    class Meta:
+        indexes = [
+            # NGOClaimsView: an NGO's claims, newest first, optionally within a date range
+            models.Index(fields=['ngo', '-claimed_at', '-id'], name='foodclaim_ngo_claimed_idx'),
+            # RestaurantDonationsView joins through the listing, then orders by claim time
+            models.Index(fields=['food_listing', '-claimed_at', '-id'], name='foodclaim_listing_claimed_idx'),
+            # Recent donations and rollup rebuilds range over claimed_at across all claims
+            models.Index(fields=['-claimed_at', '-id'], name='foodclaim_claimed_idx'),
+        ]
+
     def __str__(self):
         return f"{self.ngo.name} claimed {self.claimed_quantity} of {self.food_listing.food_name}"
 
@@ -20,7 +41,18 @@ class FoodListing(models.Model):
     pickup_address = models.CharField(max_length=255)
     special_instructions = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    status = models.CharField(max_length=20, default='available')  # Available, Partially Claimed, Claimed
+    # Available, Partially Claimed, Claimed, Expired; derived from the claims and the expiry job
+    status = models.CharField(max_length=20, default='available', editable=False)
+    # When the food can no longer be picked up; the expire_food_listings command expires the listing after it
+    pickup_window_end = models.DateTimeField(null=True, blank=True)
+    # Denormalized claim counters, kept in sync by apply_claim() (see the sync_listing_counters command)
+    claimed_quantity = models.PositiveIntegerField(default=0, editable=False)
+    remaining_quantity = models.PositiveIntegerField(default=0, editable=False)
+    # Location of the pickup address for the nearby search (geocoded, or sent by the restaurant)
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    # Set while the address still has to be geocoded (the coordinates are the restaurant's until then)
+    location_pending = models.BooleanField(default=False, editable=False)
     # restaurant = models.ForeignKey('Restaurant', on_delete=models.CASCADE, null=True)
     restaurant = models.ForeignKey('Restaurant', on_delete=models.CASCADE, null=True, related_name='food_listings')
 
@@ -28,16 +60,86 @@ class FoodListing(models.Model):
     # Use a reverse relationship to access all claims (NGOs that have claimed portions of the food)
     claimed_by = models.ManyToManyField('NGO', through='FoodClaim', related_name='claimed_food')
 
+    class Meta:
+        indexes = [
+            # Default feed: live listings (not fully claimed or expired), newest first
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=~Q(status__in=CLOSED_LISTING_STATUSES),
+                name='foodlisting_live_created_idx',
+            ),
+            # Feed filtered by ?status= or ?restaurant=
+            models.Index(fields=['status', '-created_at', '-id'], name='foodlisting_status_created_idx'),
+            models.Index(fields=['restaurant', '-created_at', '-id'], name='foodlisting_rest_created_idx'),
+            # Nearby search: bounding box over the live listings
+            models.Index(
+                fields=['latitude', 'longitude'],
+                condition=~Q(status__in=CLOSED_LISTING_STATUSES),
+                name='foodlisting_live_geo_idx',
+            ),
+            # Expiry job: live listings whose pickup window has ended
+            models.Index(
+                fields=['pickup_window_end'],
+                condition=~Q(status__in=CLOSED_LISTING_STATUSES),
+                name='foodlisting_live_expiry_idx',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.food_name} - {self.total_quantity}"
 
-    def claimed_quantity(self):
-        # Calculate the total claimed quantity by all NGOs
-        return sum(claim.claimed_quantity for claim in self.foodclaim_set.all())
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.remaining_quantity = max(self.total_quantity - self.claimed_quantity, 0)
+            return super().save(*args, **kwargs)
+
+        # This instance may be stale (an admin form, say), and claims change the counters and
+        # status concurrently, so ordinary updates leave them out and derive them from the
+        # stored claimed quantity afterwards
+        if kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in CLAIM_STATE_FIELDS
+            ]
+        super().save(*args, **kwargs)
+        if 'total_quantity' in kwargs['update_fields']:
+            FoodListing.objects.filter(pk=self.pk).update(
+                remaining_quantity=Greatest(F('total_quantity') - F('claimed_quantity'), Value(0)),
+                status=Case(
+                    When(status='expired', then=Value('expired')),
+                    When(claimed_quantity__gte=F('total_quantity'), then=Value('claimed')),
+                    When(claimed_quantity__gt=0, then=Value('partially claimed')),
+                    default=Value('available'),
+                ),
+            )
+            self.refresh_from_db(fields=CLAIM_STATE_FIELDS)
+
+    def is_expired(self):
+        # Expired by the job, or past the end of the pickup window and not yet picked up by it
+        return self.status == 'expired' or (
+            self.pickup_window_end is not None and self.pickup_window_end <= timezone.now()
+        )
 
-    def remaining_quantity(self):
-        # Return the remaining quantity of food available for claiming
-        return self.total_quantity - self.claimed_quantity()
+    def apply_claim(self, quantity):
+        # Reserve the quantity with a single conditional UPDATE using F() expressions. The
+        # WHERE clause only matches while enough food remains (and the listing hasn't
+        # expired), so concurrent claims can never over-claim the listing. Returns False
+        # when the listing can't be claimed.
+        updated = FoodListing.objects.filter(
+            Q(pickup_window_end__isnull=True) | Q(pickup_window_end__gt=timezone.now()),
+            pk=self.pk,
+            remaining_quantity__gte=quantity,
+        ).exclude(status='expired').update(
+            claimed_quantity=F('claimed_quantity') + quantity,
+            remaining_quantity=F('remaining_quantity') - quantity,
+            status=Case(
+                When(remaining_quantity=quantity, then=Value('claimed')),
+                default=Value('partially claimed'),
+            ),
+        )
+        self.refresh_from_db(fields=['claimed_quantity', 'remaining_quantity', 'status', 'pickup_window_end'])
+        return bool(updated)
 
 # Model for Restaurants
 class Restaurant(models.Model):
@@ -47,6 +149,11 @@ class Restaurant(models.Model):
     email = models.EmailField()
     phone = models.CharField(max_length=15)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Geocoded from the address; new listings fall back to it
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    # Set while the address still has to be geocoded
+    location_pending = models.BooleanField(default=False, editable=False)
 
     def __str__(self):
         return self.name
@@ -62,3 +169,76 @@ class NGO(models.Model):
 
     def __str__(self):
         return self.name
+
+# Per-day, per-restaurant donation totals, maintained by the claim path so the
+# statistics endpoints don't have to scan every FoodClaim
+class DonationDailyRollup(models.Model):
+    day = models.DateField()
+    restaurant = models.ForeignKey('Restaurant', on_delete=models.CASCADE, null=True, related_name='daily_rollups')
+    claims_count = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'restaurant'], name='unique_rollup_day_restaurant'),
+            # NULLs never conflict in the constraint above, so listings without a restaurant
+            # need their own one row per day
+            models.UniqueConstraint(
+                fields=['day'], condition=Q(restaurant__isnull=True), name='unique_rollup_day_no_restaurant'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} - {self.restaurant_id}: {self.claims_count} claims, {self.quantity} total"
+
+    @classmethod
+    def add_claims(cls, day, restaurant_id, quantity, claims_count=1):
+        # Increment the day's row in place, creating it for the first claim of the day. If a
+        # concurrent claim creates the row first, the unique constraint fails and we retry
+        # the increment
+        increment = dict(claims_count=F('claims_count') + claims_count, quantity=F('quantity') + quantity)
+        if cls.objects.filter(day=day, restaurant_id=restaurant_id).update(**increment):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    day=day, restaurant_id=restaurant_id, claims_count=claims_count, quantity=quantity
+                )
+        except IntegrityError:
+            cls.objects.filter(day=day, restaurant_id=restaurant_id).update(**increment)
+
+
+# Claimed and expired listings, with their claims, are moved to these tables by the
+# archive_food_listings command once they are old, so the live tables stay small. Rows keep
+# their original ids; the statistics rollup still counts the archived claims, and the claim
+# histories and exports read them too (see base/history.py).
+class ArchivedFoodListing(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    food_name = models.CharField(max_length=100)
+    total_quantity = models.PositiveIntegerField()
+    available_pickup_times = models.CharField(max_length=100)
+    pickup_address = models.CharField(max_length=255)
+    special_instructions = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    status = models.CharField(max_length=20)
+    pickup_window_end = models.DateTimeField(null=True, blank=True)
+    claimed_quantity = models.PositiveIntegerField(default=0)
+    remaining_quantity = models.PositiveIntegerField(default=0)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    restaurant = models.ForeignKey('Restaurant', on_delete=models.CASCADE, null=True, related_name='archived_food_listings')
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.food_name} - {self.total_quantity} (archived)"
+
+
+class ArchivedFoodClaim(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    food_listing = models.ForeignKey('ArchivedFoodListing', on_delete=models.CASCADE, related_name='claims')
+    ngo = models.ForeignKey('NGO', on_delete=models.CASCADE, related_name='archived_claims')
+    claimed_quantity = models.PositiveIntegerField()
+    claimed_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"{self.ngo.name} claimed {self.claimed_quantity} of archived listing {self.food_listing_id}"
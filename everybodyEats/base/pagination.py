@@ -0,0 +1,19 @@
+from rest_framework.pagination import CursorPagination
+
+
+# Cursor pagination for the food listings feed, newest first. DRF's cursor positions on
+# the first ordering field (created_at) plus an offset over rows sharing that value, so
+# deep pages cost about the same as the first one; id only makes the order stable.
+class FoodListingCursorPagination(CursorPagination):
+    ordering = ("-created_at", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+
+# Keyset pagination for donation/claim histories, most recent claim first.
+class FoodClaimCursorPagination(CursorPagination):
+    ordering = ("-claimed_at", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 200
@@ -0,0 +1,182 @@
+from datetime import date, datetime, timezone as dt_timezone
+
+from django.utils import timezone
+
+# Optional monthly range partitioning of base_foodclaim on claimed_at (PostgreSQL only,
+# enabled with settings.FOOD_CLAIM_PARTITIONING). Queries that filter on claimed_at, such
+# as the claim history/export ?claimed_after=/?claimed_before= ranges and the recent
+# donations lookup, then only read the partitions for those months.
+#
+# On the partitioned table the primary key is (id, claimed_at), since PostgreSQL requires
+# the partition key in every unique constraint; ids still come from the identity sequence.
+# Claims whose month has no partition land in the default partition, and
+# create_claim_partitions moves them out when it creates that month.
+
+TABLE = "base_foodclaim"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+def is_partitioned(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relkind = 'p' FROM pg_class c WHERE c.oid = to_regclass(%s)", [TABLE]
+        )
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_p{month.year}_{month.month:02d}"
+
+
+def _bound(month):
+    # Month boundaries in UTC
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc).isoformat()
+
+
+def create_partition(schema_editor, month):
+    """
+    Create the partition for `month` unless it exists. Claims already sitting in the
+    default partition for that month are moved into it.
+    """
+    name = schema_editor.quote_name(partition_name(month))
+    table = schema_editor.quote_name(TABLE)
+    default = schema_editor.quote_name(DEFAULT_PARTITION)
+    start, end = _bound(month), _bound(next_month(month))
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [partition_name(month)])
+        if cursor.fetchone()[0]:
+            return False
+
+    # Build it detached, move any matching rows out of the default partition, then attach
+    # (PostgreSQL refuses to add a partition while the default one holds rows for it)
+    # ATTACH PARTITION requires the parent's CHECK constraints on the partition
+    schema_editor.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    schema_editor.execute(
+        f"WITH moved AS (DELETE FROM {default} WHERE claimed_at >= %s AND claimed_at < %s RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved",
+        [start, end],
+    )
+    schema_editor.execute(
+        f"ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"
+    )
+    return True
+
+
+def create_partitions(schema_editor, months_ahead, first_month=None):
+    # Partitions from first_month (default: the current month) up to months_ahead months
+    # from now
+    month = first_month or month_start(timezone.now().astimezone(dt_timezone.utc))
+    last = month_start(timezone.now().astimezone(dt_timezone.utc))
+    for _ in range(months_ahead):
+        last = next_month(last)
+    created = 0
+    while month <= last:
+        created += create_partition(schema_editor, month)
+        month = next_month(month)
+    return created
+
+
+def _oldest_claim_month(schema_editor, table):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(claimed_at) FROM {schema_editor.quote_name(table)}")
+        oldest = cursor.fetchone()[0]
+    return month_start(oldest.astimezone(dt_timezone.utc)) if oldest else None
+
+
+def _release_names(schema_editor, old_table):
+    # The renamed table's keys and indexes keep their names; drop them so the new table
+    # can use the same ones (CHECK constraint names are per table, so those stay)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'f')",
+            [old_table],
+        )
+        constraints = [row[0] for row in cursor.fetchall()]
+    for constraint in constraints:
+        schema_editor.execute(
+            f"ALTER TABLE {schema_editor.quote_name(old_table)} DROP CONSTRAINT {schema_editor.quote_name(constraint)}"
+        )
+    # Then the remaining indexes: the Meta indexes and the foreign key column indexes
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = to_regclass(%s)", [old_table]
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+    for index in indexes:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+def _swap_in(schema_editor, model, old_table, primary_key):
+    # Copy the rows over and drop the old table, then build the keys and indexes (faster
+    # than maintaining them during the copy) and keep the id sequence ahead of the rows
+    table = schema_editor.quote_name(TABLE)
+    schema_editor.execute(f"INSERT INTO {table} SELECT * FROM {schema_editor.quote_name(old_table)}")
+    schema_editor.execute(f"DROP TABLE {schema_editor.quote_name(old_table)}")
+
+    schema_editor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY ({primary_key})")
+    # The same deferred foreign keys and foreign key column indexes, under the same names,
+    # that Django creates for the model
+    for field in model._meta.local_fields:
+        if field.remote_field and field.db_constraint:
+            schema_editor.execute(schema_editor._create_fk_sql(model, field, "_fk_%(to_table)s_%(to_column)s"))
+        for statement in schema_editor._field_indexes_sql(model, field):
+            schema_editor.execute(statement)
+    for index in model._meta.indexes:
+        schema_editor.add_index(model, index)
+
+    schema_editor.execute(
+        f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)",
+        [TABLE],
+    )
+
+
+def partition_food_claims(schema_editor, model, months_ahead):
+    """
+    Turn base_foodclaim into a table partitioned by month on claimed_at, with partitions
+    from the oldest claim up to `months_ahead` months from now. Runs in the caller's
+    transaction and rewrites the whole table, so schedule it accordingly.
+    """
+    old_table = f"{TABLE}_unpartitioned"
+    quote = schema_editor.quote_name
+    schema_editor.execute(f"ALTER TABLE {quote(TABLE)} RENAME TO {quote(old_table)}")
+    _release_names(schema_editor, old_table)
+    # Claims from before claimed_at was recorded fall back to their listing's creation time
+    # (as migration 0012 did), since the partition key can't be NULL
+    schema_editor.execute(
+        f"UPDATE {quote(old_table)} c SET claimed_at = l.created_at FROM base_foodlisting l "
+        "WHERE c.claimed_at IS NULL AND l.id = c.food_listing_id"
+    )
+
+    schema_editor.execute(
+        f"CREATE TABLE {quote(TABLE)} "
+        f"(LIKE {quote(old_table)} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS) "
+        "PARTITION BY RANGE (claimed_at)"
+    )
+    schema_editor.execute(f"ALTER TABLE {quote(TABLE)} ALTER COLUMN claimed_at SET NOT NULL")
+    schema_editor.execute(f"CREATE TABLE {quote(DEFAULT_PARTITION)} PARTITION OF {quote(TABLE)} DEFAULT")
+    create_partitions(schema_editor, months_ahead, _oldest_claim_month(schema_editor, old_table))
+    _swap_in(schema_editor, model, old_table, "id, claimed_at")
+
+
+def unpartition_food_claims(schema_editor, model):
+    # Turn the partitioned table back into a single plain table
+    old_table = f"{TABLE}_partitioned"
+    quote = schema_editor.quote_name
+    schema_editor.execute(f"ALTER TABLE {quote(TABLE)} RENAME TO {quote(old_table)}")
+    _release_names(schema_editor, old_table)
+    schema_editor.execute(
+        f"CREATE TABLE {quote(TABLE)} "
+        f"(LIKE {quote(old_table)} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS)"
+    )
+    schema_editor.execute(f"ALTER TABLE {quote(TABLE)} ALTER COLUMN claimed_at DROP NOT NULL")
+    _swap_in(schema_editor, model, old_table, "id")
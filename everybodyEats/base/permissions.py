@@ -0,0 +1,19 @@
+from rest_framework.permissions import BasePermission
+
+from .roles import ROLE_NGO, ROLE_RESTAURANT, resolve_role
+
+
+# Allows access only to users with a Restaurant profile (sets request.restaurant_id)
+class IsRestaurant(BasePermission):
+    message = "The user is not associated with a restaurant."
+
+    def has_permission(self, request, view):
+        return resolve_role(request) == ROLE_RESTAURANT
+
+
+# Allows access only to users with an NGO profile (sets request.ngo_id)
+class IsNGO(BasePermission):
+    message = "The user is not associated with an NGO."
+
+    def has_permission(self, request, view):
+        return resolve_role(request) == ROLE_NGO
@@ -0,0 +1,122 @@
+import datetime
+import io
+import re
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import timed_serialization
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to DRF's stdlib json implementation
+    orjson = None
+
+# orjson's defaults already match DRF's compact, UTF-8, strict output; these add the
+# remaining pieces: "Z" for UTC datetimes and str() for non-string dict keys
+ORJSON_OPTIONS = (orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+# orjson reads integers beyond 64 bits as floats, where json keeps them exact
+LONG_INTEGER = re.compile(rb'\d{20}')
+
+SCALAR_TYPES = {str, int, bool, type(None), datetime.datetime}
+
+
+def orjson_writes_like_json(value):
+    """
+    Whether every float in value is written the same by orjson and json. The stdlib
+    switches to exponent notation below 1e-4 and from 1e16 (1e-05, 1e+20) and orjson
+    doesn't (0.00001, 1e20); NaN and infinities are null in orjson where DRF raises.
+    """
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            value = value.values()
+        elif not isinstance(value, (list, tuple)):
+            value = (value,)
+        for item in value:
+            # Runs over every value of the response: skip the common scalars with one lookup
+            item_type = type(item)
+            if item_type in SCALAR_TYPES:
+                continue
+            if item_type is float or isinstance(item, float):
+                if not (1e-4 <= item < 1e16 or -1e16 < item <= -1e-4 or item == 0):
+                    return False
+            elif isinstance(item, (dict, list, tuple)):
+                stack.append(item)
+    return True
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Drop-in JSONRenderer that encodes with orjson when it is installed. The output is
+    the same as DRF's; pretty-printed and non-default JSON settings, and data orjson
+    would write differently, use DRF's renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Counted as the request's serialization time in the request metrics
+        with timed_serialization():
+            return self.encode(data, accepted_media_type, renderer_context)
+
+    def encode(self, data, accepted_media_type, renderer_context):
+        if (
+            orjson is None
+            or not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+            or not orjson_writes_like_json(data)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b''
+
+        encoder = self.encoder_class()
+
+        def default(obj):
+            # Anything orjson can't encode natively (Decimal, lazy strings, querysets,
+            # timedelta, ...) is converted by DRF's encoder
+            converted = encoder.default(obj)
+            if not orjson_writes_like_json(converted):
+                raise TypeError('Encoded with json')
+            return converted
+
+        try:
+            ret = orjson.dumps(data, default=default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # Integers beyond 64 bits, the floats above inside converted values, and
+            # unsupported types: json encodes them or raises the error DRF would
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escape \u2028 and \u2029 like DRF does, so the output stays a JavaScript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser that decodes with orjson when it is installed. Other request encodings,
+    integers beyond 64 bits and bodies orjson rejects use DRF's parser, so the results
+    and errors are DRF's.
+    """
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        if not LONG_INTEGER.search(body):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                # json accepts some input orjson doesn't (1e400, lone surrogates) and
+                # words its errors differently
+                pass
+        return super().parse(io.BytesIO(body), media_type, parser_context)
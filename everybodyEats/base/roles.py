@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.tokens import Token as JWTToken
+
+from .models import NGO, Restaurant
+
+ROLE_RESTAURANT = "restaurant"
+ROLE_NGO = "ngo"
+
+
+def _role_cache_key(user_id):
+    return f"user-role:{user_id}"
+
+
+def get_user_role(user):
+    """
+    Return `(role, profile_id)` for `user`, where role is "restaurant", "ngo" or None.
+
+    The mapping is cached per user and dropped whenever the user's Restaurant or NGO
+    profile is saved or deleted (see base.signals).
+    """
+    if user is None or not user.is_authenticated:
+        return None, None
+
+    key = _role_cache_key(user.pk)
+    cached = cache.get(key)
+    if cached is None:
+        restaurant_id = Restaurant.objects.filter(user_id=user.pk).values_list("id", flat=True).first()
+        if restaurant_id is not None:
+            cached = (ROLE_RESTAURANT, restaurant_id)
+        else:
+            ngo_id = NGO.objects.filter(user_id=user.pk).values_list("id", flat=True).first()
+            cached = (ROLE_NGO, ngo_id) if ngo_id is not None else (None, None)
+        cache.set(key, cached, settings.USER_ROLE_CACHE_TTL)
+    return cached
+
+
+def forget_user_role(user_id):
+    cache.delete(_role_cache_key(user_id))
+
+
+def resolve_role(request):
+    """
+    Resolve the role of the request's user once per request and attach it as
+    `request.role`, `request.restaurant_id` and `request.ngo_id`. Requests authenticated
+    with a JWT take the role from the token's claims.
+    """
+    if not hasattr(request, "role"):
+        if isinstance(request.auth, JWTToken) and "role" in request.auth:
+            # JWT access tokens already carry the role claims
+            role, profile_id = request.auth["role"], request.auth.get("profile_id")
+        else:
+            role, profile_id = get_user_role(request.user)
+        request.role = role
+        request.restaurant_id = profile_id if role == ROLE_RESTAURANT else None
+        request.ngo_id = profile_id if role == ROLE_NGO else None
+    return request.role
@@ -0,0 +1,52 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+# Text search over food listings (?q=). On PostgreSQL this is full-text search against the
+# GIN expression index created by migration 0016 (over the live listings, see 0017); on
+# SQLite it uses the FTS5 table that 0016 keeps in sync with triggers. Other databases fall
+# back to icontains.
+
+# The weighted document the PostgreSQL index is built on. The query has to use the exact
+# same expression for the planner to pick the index, so keep it in sync with migration 0016
+SEARCH_DOCUMENT_SQL = (
+    "(setweight(to_tsvector('english'::regconfig, COALESCE({table}food_name, '')), 'A') || "
+    "setweight(to_tsvector('english'::regconfig, COALESCE({table}special_instructions, '')), 'B'))"
+)
+
+SQLITE_SEARCH_TABLE = "base_foodlisting_fts"
+
+
+def search_food_listings(queryset, query):
+    # Listings matching `query`, annotated with search_rank and ordered best match first
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        document = SEARCH_DOCUMENT_SQL.format(table='"base_foodlisting".')
+        ts_query = "websearch_to_tsquery('english'::regconfig, %s)"
+        queryset = queryset.filter(
+            RawSQL(f"{document} @@ {ts_query}", [query], output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(f"ts_rank({document}, {ts_query})", [query], output_field=FloatField())
+        )
+    elif vendor == "sqlite":
+        # Every word has to match; quoting them keeps FTS5 syntax in the input literal
+        words = re.findall(r"\w+", query)
+        if not words:
+            return queryset.none()
+        match = " ".join('"%s"' % word for word in words)
+        # Joined rather than ranked in a correlated subquery: that runs the MATCH again for
+        # every matching listing, which is quadratic in the number of matches
+        queryset = queryset.extra(
+            tables=[SQLITE_SEARCH_TABLE],
+            where=[f'{SQLITE_SEARCH_TABLE}.rowid = "base_foodlisting"."id"', f"{SQLITE_SEARCH_TABLE} MATCH %s"],
+            params=[match],
+            # bm25() is lower for better matches; the food name counts double
+            select={"search_rank": f"-bm25({SQLITE_SEARCH_TABLE}, 2.0, 1.0)"},
+        )
+    else:
+        queryset = queryset.filter(
+            Q(food_name__icontains=query) | Q(special_instructions__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+    return queryset.order_by("-search_rank", "-created_at", "-id")
@@ -1,9 +1,116 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import FoodListing, Restaurant, NGO, FoodClaim
+from django.db import transaction
+from django.utils import timezone
+from .cache import invalidate_model
+from .events import LISTING_CREATED, publish_on_commit
+from .geo import cached_geocode, geocode_later, geocoding_enabled
+from .metrics import timed_serialization
+from .models import CLOSED_LISTING_STATUSES, FoodListing, Restaurant, NGO, FoodClaim
+from .roles import ROLE_NGO, ROLE_RESTAURANT, resolve_role
+from .services import claim_food_listing, claim_food_listings
 from rest_framework.permissions import AllowAny
 
 
+def _values_row(row, accessors):
+    ret = {}
+    for key, lookup, to_representation, nested, optional in accessors:
+        if nested is not None:
+            ret[key] = _values_row(row, nested)
+            continue
+        value = row[lookup]
+        if value is None:
+            # A missing related object makes DRF skip a dotted-source field entirely
+            if not optional:
+                ret[key] = None
+        elif to_representation is None:
+            ret[key] = value
+        else:
+            ret[key] = to_representation(value)
+    return ret
+
+
+# Fast read path for the hot list endpoints. Instead of building a model instance and
+# walking the bound fields for every object, rows are fetched with .values() and turned
+# into dicts by accessors compiled once per serializer from its own fields, so the output
+# is the same as serializer.data
+class ValuesReadMixin:
+    @classmethod
+    def values_accessors(cls, prefix=""):
+        compiled = cls.__dict__.get("_compiled_values_accessors")
+        if compiled is None:
+            compiled = cls._compiled_values_accessors = {}
+        if prefix not in compiled:
+            compiled[prefix] = cls._compile_values_accessors(prefix)
+        return compiled[prefix]
+
+    @classmethod
+    def _compile_values_accessors(cls, prefix):
+        accessors = []
+        for name, field in cls().fields.items():
+            if field.write_only:
+                continue
+            lookup = prefix + field.source.replace(".", "__")
+            if isinstance(field, ValuesReadMixin):
+                accessors.append((name, None, None, field.values_accessors(lookup + "__"), False))
+            elif isinstance(field, serializers.RelatedField):
+                # .values() already returns the related primary key
+                accessors.append((name, lookup, None, None, False))
+            else:
+                accessors.append((name, lookup, field.to_representation, None, "." in field.source))
+        return accessors
+
+    @classmethod
+    def values_lookups(cls, accessors=None):
+        lookups = []
+        for _, lookup, _, nested, _ in accessors or cls.values_accessors():
+            lookups.extend(cls.values_lookups(nested) if nested is not None else [lookup])
+        return lookups
+
+    @classmethod
+    def values_queryset(cls, queryset):
+        # Only the columns the serializer renders, as dicts
+        return queryset.values(*cls.values_lookups())
+
+    @classmethod
+    def values_data(cls, rows):
+        accessors = cls.values_accessors()
+        with timed_serialization():
+            return [_values_row(row, accessors) for row in rows]
+
+
+# Building the response data counts as serialization time in the request metrics, like
+# encoding it does (with many=True, each object is counted as it is represented)
+class TimedRepresentationMixin:
+    def to_representation(self, instance):
+        with timed_serialization():
+            return super().to_representation(instance)
+
+
+def validate_coordinates(attrs):
+    if (attrs.get("latitude") is None) != (attrs.get("longitude") is None):
+        raise serializers.ValidationError("Latitude and longitude must be sent together.")
+    return attrs
+
+
+def locate(data, address, fallback=None):
+    # Fill in latitude/longitude without waiting on the geocoder: the client's coordinates,
+    # a cached geocoding answer, or else the fallback (latitude, longitude). Sets
+    # location_pending when the address still has to be geocoded (see geocode_later)
+    data["location_pending"] = False
+    if data.get("latitude") is None:
+        found, location = cached_geocode(address)
+        data["location_pending"] = not found and bool(address) and geocoding_enabled()
+        location = location or fallback
+        if location and location[0] is not None:
+            data["latitude"], data["longitude"] = location
+    return data
+
+
+def restaurant_location(restaurant_id):
+    return Restaurant.objects.filter(pk=restaurant_id).values_list("latitude", "longitude").first()
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -16,8 +123,43 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
+# Creates a whole batch of food listings for the logged-in restaurant in one INSERT
+class FoodListingListSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        # Resolve the restaurant once for the whole batch
+        request = self.context["request"]
+        if resolve_role(request) != ROLE_RESTAURANT:
+            raise serializers.ValidationError("Restaurant not found for this user.")
+
+        # Listings are placed at the restaurant until their pickup address is geocoded
+        fallback = restaurant_location(request.restaurant_id)
+
+        # bulk_create skips save(), so set the remaining quantity here
+        food_listings = [
+            FoodListing(
+                restaurant_id=request.restaurant_id,
+                remaining_quantity=item["total_quantity"],
+                **locate(item, item["pickup_address"], fallback),
+            )
+            for item in validated_data
+        ]
+        with transaction.atomic():
+            food_listings = FoodListing.objects.bulk_create(food_listings)
+            geocode_later(
+                FoodListing,
+                "pickup_address",
+                [food_listing.pk for food_listing in food_listings if food_listing.location_pending],
+            )
+
+        # bulk_create sends no post_save signals, so invalidate cached responses here
+        invalidate_model(FoodListing)
+        for food_listing in food_listings:
+            publish_on_commit(LISTING_CREATED, self.child.to_representation(food_listing))
+        return food_listings
+
+
 # Serializer for the FoodListing model
-class FoodListingSerializer(serializers.ModelSerializer):
+class FoodListingSerializer(TimedRepresentationMixin, ValuesReadMixin, serializers.ModelSerializer):
     class Meta:
         model = FoodListing
         fields = [
@@ -31,29 +173,47 @@ class FoodListingSerializer(serializers.ModelSerializer):
             "created_at",
             "status",
             "restaurant",
+            "latitude",
+            "longitude",
+            "pickup_window_end",
         ]
+        read_only_fields = ["remaining_quantity"]
+        list_serializer_class = FoodListingListSerializer
+
+    def validate_pickup_window_end(self, value):
+        if value is not None and value <= timezone.now():
+            raise serializers.ValidationError("The pickup window must end in the future.")
+        return value
+
+    def validate(self, attrs):
+        return validate_coordinates(attrs)
 
     def create(self, validated_data):
-        # Get the currently authenticated user (which is the restaurant)
-        user = self.context[
-            "request"
-        ].user  # Get the logged-in user from the request context
-
-        # Fetch the restaurant associated with the logged-in user
-        try:
-            restaurant = Restaurant.objects.get(user=user)
-        except Restaurant.DoesNotExist:
+        # Get the currently authenticated user (which is the restaurant) and its cached role
+        request = self.context["request"]
+
+        # Resolve the restaurant associated with the logged-in user
+        if resolve_role(request) != ROLE_RESTAURANT:
             raise serializers.ValidationError("Restaurant not found for this user.")
 
+        # Place the listing at its pickup address, or at the restaurant until that is geocoded
+        fallback = None
+        if validated_data.get("latitude") is None:
+            fallback = restaurant_location(request.restaurant_id)
+        locate(validated_data, validated_data["pickup_address"], fallback)
+
         # Create the FoodListing and assign the restaurant
         food_listing = FoodListing.objects.create(
-            restaurant=restaurant, **validated_data
+            restaurant_id=request.restaurant_id, **validated_data
         )
+        if food_listing.location_pending:
+            geocode_later(FoodListing, "pickup_address", [food_listing.pk])
+        publish_on_commit(LISTING_CREATED, self.to_representation(food_listing))
         return food_listing
 
 
 # Serializer for the Restaurant model
-class RestaurantSerializer(serializers.ModelSerializer):
+class RestaurantSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     user = UserSerializer()
     food_listings = (
         serializers.SerializerMethodField()
@@ -61,26 +221,33 @@ class RestaurantSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Restaurant
-        fields = ["id", "user", "name", "address", "phone", "food_listings"]
+        fields = ["id", "user", "name", "address", "phone", "latitude", "longitude", "food_listings"]
+
+    def validate(self, attrs):
+        return validate_coordinates(attrs)
 
     def get_food_listings(self, obj):
-        # Filter food listings to exclude those with status 'claimed'
-        food_listings = FoodListing.objects.filter(restaurant=obj).exclude(
-            status="claimed"
-        )
+        # Use the live listings prefetched by the views when available, otherwise
+        # filter food listings to exclude claimed and expired ones
+        food_listings = getattr(obj, "available_food_listings", None)
+        if food_listings is None:
+            food_listings = obj.food_listings.exclude(status__in=CLOSED_LISTING_STATUSES)
         return FoodListingSerializer(food_listings, many=True).data
 
     def create(self, validated_data):
         user_data = validated_data.pop("user")
         user = User.objects.create_user(**user_data)
+        locate(validated_data, validated_data["address"])
         restaurant = Restaurant.objects.create(user=user, **validated_data)
         restaurant.email = user.email
         restaurant.save()
+        if restaurant.location_pending:
+            geocode_later(Restaurant, "address", [restaurant.pk])
         return restaurant
 
 
 # Serializer for the NGO model
-class NGOSerializer(serializers.ModelSerializer):
+class NGOSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     user = UserSerializer()
 
     class Meta:
@@ -97,7 +264,7 @@ class NGOSerializer(serializers.ModelSerializer):
 
 
 # Serializer for the FoodClaim model (to handle claiming functionality)
-class FoodClaimSerializer(serializers.ModelSerializer):
+class FoodClaimSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     class Meta:
         model = FoodClaim
         fields = ['food_listing', 'claimed_quantity', 'claimed_at']
@@ -111,50 +278,59 @@ class FoodClaimSerializer(serializers.ModelSerializer):
         return value
 
     def create(self, validated_data):
-        # Get the logged-in user (NGO)
-        user = self.context["request"].user
-        try:
-            ngo = NGO.objects.get(user=user)
-        except NGO.DoesNotExist:
+        # Get the logged-in user's NGO (cached role lookup)
+        request = self.context["request"]
+        if resolve_role(request) != ROLE_NGO:
             raise serializers.ValidationError("The user is not associated with an NGO.")
 
         # Get the food listing from validated data
         food_listing = validated_data["food_listing"]
         claimed_quantity = validated_data["claimed_quantity"]
 
-        # Check if enough food is available for claiming
-        if claimed_quantity > food_listing.remaining_quantity():
-            raise serializers.ValidationError(
-                f"Not enough food remaining. Only {food_listing.remaining_quantity()} available."
-            )
-
         # Check if the NGO has already claimed this food
         # if food_listing.claimed_by.filter(id=ngo.id).exists():
         #     raise serializers.ValidationError("This NGO has already claimed a portion of this food.")
 
-        # Create the food claim
-        food_claim = FoodClaim.objects.create(
-            food_listing=food_listing, ngo=ngo, claimed_quantity=claimed_quantity
-        )
-
-        # Update the food listing's status based on the remaining quantity
-        if food_listing.remaining_quantity() == 0:
-            food_listing.status = "claimed"  # All food claimed
-        else:
-            food_listing.status = (
-                "partially claimed"  # Part of the food still available
-            )
-        food_listing.save()
+        # Reserve the food and create the claim atomically (409 if not enough is left)
+        food_claim = claim_food_listing(request.ngo_id, food_listing, claimed_quantity)
 
         return food_claim
 
-class FoodListingCustomSerializer(serializers.ModelSerializer):
+class BatchClaimItemSerializer(serializers.Serializer):
+    food_listing = serializers.IntegerField(min_value=1)
+    claimed_quantity = serializers.IntegerField(min_value=1)
+
+
+# Serializer for claiming several food listings in one request (all or nothing)
+class BatchClaimSerializer(TimedRepresentationMixin, serializers.Serializer):
+    claims = BatchClaimItemSerializer(many=True, allow_empty=False, max_length=50)
+
+    def validate_claims(self, value):
+        listing_ids = [item["food_listing"] for item in value]
+        if len(listing_ids) != len(set(listing_ids)):
+            raise serializers.ValidationError("Each food listing can only be claimed once per batch.")
+        return value
+
+    def create(self, validated_data):
+        # The view's IsNGO permission has resolved the NGO
+        request = self.context["request"]
+        if resolve_role(request) != ROLE_NGO:
+            raise serializers.ValidationError("The user is not associated with an NGO.")
+
+        quantities = {item["food_listing"]: item["claimed_quantity"] for item in validated_data["claims"]}
+        return claim_food_listings(request.ngo_id, quantities)
+
+    def to_representation(self, instance):
+        return {"claims": FoodClaimSerializer(instance, many=True).data}
+
+
+class FoodListingCustomSerializer(ValuesReadMixin, serializers.ModelSerializer):
     restaurant_name = serializers.CharField(source='restaurant.name', read_only=True)
     class Meta:
         model = FoodListing
         fields = ['id', 'food_name', 'available_pickup_times', 'pickup_address', 'restaurant_name']
 
-class FoodClaimDonationSerializer(serializers.ModelSerializer):
+class FoodClaimDonationSerializer(ValuesReadMixin, serializers.ModelSerializer):
     food_listing = FoodListingCustomSerializer()  # Use the FoodListingSerializer for nested details
 
     class Meta:
@@ -0,0 +1,131 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from .cache import invalidate_model
+from .events import publish_listing_change
+from .models import DonationDailyRollup, FoodClaim, FoodListing
+
+
+class ClaimConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Not enough food remaining."
+    default_code = "claim_conflict"
+
+    def __init__(self, detail=None, code=None, shortfalls=None):
+        super().__init__(detail, code)
+        if shortfalls is not None:
+            # Set directly so the quantities stay numbers in the response
+            self.detail = {"detail": self.detail, "shortfalls": shortfalls}
+
+
+def claim_food_listing(ngo_id, food_listing, claimed_quantity):
+    """
+    Reserve `claimed_quantity` of `food_listing` for the NGO `ngo_id` and record the claim.
+
+    The reservation, the FoodClaim insert and the daily statistics rollup happen in one
+    transaction, so a failed insert never leaves the counters ahead of the claims. Raises
+    ClaimConflict when the listing has expired or no longer has enough food left.
+    """
+    with transaction.atomic():
+        if not food_listing.apply_claim(claimed_quantity):
+            if food_listing.is_expired():
+                raise ClaimConflict("This food listing has expired.")
+            raise ClaimConflict(
+                f"Not enough food remaining. Only {food_listing.remaining_quantity} available."
+            )
+        food_claim = FoodClaim.objects.create(
+            food_listing=food_listing, ngo_id=ngo_id, claimed_quantity=claimed_quantity
+        )
+        DonationDailyRollup.add_claims(
+            timezone.localdate(food_claim.claimed_at),
+            food_listing.restaurant_id,
+            claimed_quantity,
+        )
+        publish_listing_change(food_listing)
+        return food_claim
+
+
+def claim_food_listings(ngo_id, quantities):
+    """
+    Claim several food listings at once for the NGO `ngo_id`, all or nothing.
+
+    `quantities` maps food listing ids to the quantity to claim. The listings are locked
+    in primary key order and the daily rollups in (day, restaurant) order, so concurrent
+    batches can't deadlock, and every quantity is checked before anything is written.
+    Raises ClaimConflict (and claims nothing) when any listing has expired, listing each
+    shortfall when any has too little food left.
+    """
+    with transaction.atomic():
+        food_listings = list(
+            FoodListing.objects.select_for_update().filter(pk__in=quantities).order_by("pk")
+        )
+        missing = set(quantities) - {food_listing.pk for food_listing in food_listings}
+        if missing:
+            raise ValidationError(
+                {"food_listing": [f"Invalid pk \"{pk}\" - object does not exist." for pk in sorted(missing)]}
+            )
+
+        expired = [food_listing.pk for food_listing in food_listings if food_listing.is_expired()]
+        if expired:
+            raise ClaimConflict(
+                "These food listings have expired: " + ", ".join(str(pk) for pk in expired) + "."
+            )
+
+        shortfalls = [
+            {
+                "food_listing": food_listing.pk,
+                "claimed_quantity": quantities[food_listing.pk],
+                "remaining_quantity": food_listing.remaining_quantity,
+            }
+            for food_listing in food_listings
+            if quantities[food_listing.pk] > food_listing.remaining_quantity
+        ]
+        if shortfalls:
+            raise ClaimConflict(shortfalls=shortfalls)
+
+        # The rows are locked, so the counters can be updated in Python and written back
+        # with a single bulk_update
+        for food_listing in food_listings:
+            quantity = quantities[food_listing.pk]
+            food_listing.claimed_quantity += quantity
+            food_listing.remaining_quantity -= quantity
+            food_listing.status = "claimed" if food_listing.remaining_quantity == 0 else "partially claimed"
+        FoodListing.objects.bulk_update(
+            food_listings, ["claimed_quantity", "remaining_quantity", "status"]
+        )
+
+        food_claims = FoodClaim.objects.bulk_create(
+            [
+                FoodClaim(
+                    food_listing=food_listing,
+                    ngo_id=ngo_id,
+                    claimed_quantity=quantities[food_listing.pk],
+                )
+                for food_listing in food_listings
+            ]
+        )
+
+        # One rollup increment per restaurant and day rather than per claim. Each increment
+        # locks its rollup row, so they also go in a fixed (day, restaurant) order: in listing
+        # order two batches over different restaurants could each lock one row and wait on
+        # the other's
+        rollups = defaultdict(lambda: [0, 0])
+        for food_claim in food_claims:
+            totals = rollups[timezone.localdate(food_claim.claimed_at), food_claim.food_listing.restaurant_id]
+            totals[0] += 1
+            totals[1] += food_claim.claimed_quantity
+        for (day, restaurant_id), (claims_count, quantity) in sorted(
+            rollups.items(), key=lambda item: (item[0][0], item[0][1] or 0)
+        ):
+            DonationDailyRollup.add_claims(day, restaurant_id, quantity, claims_count)
+
+        # Bulk writes send no signals, so invalidate cached responses explicitly
+        invalidate_model(FoodListing)
+        invalidate_model(FoodClaim)
+        for food_listing in food_listings:
+            publish_listing_change(food_listing)
+        return food_claims
@@ -0,0 +1,50 @@
+from functools import partial
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_token
+from .cache import invalidate_model
+from .models import NGO, DonationDailyRollup, FoodClaim, FoodListing, Restaurant
+from .roles import forget_user_role
+
+
+# Any write to a model that cached responses are built from invalidates them. Connected
+# per sender: a post_delete receiver for every model would turn off Django's fast
+# deletes project-wide
+def invalidate_cached_responses(sender, **kwargs):
+    invalidate_model(sender)
+
+
+for model in (FoodListing, FoodClaim, Restaurant, NGO, DonationDailyRollup):
+    post_save.connect(invalidate_cached_responses, sender=model)
+    post_delete.connect(invalidate_cached_responses, sender=model)
+
+
+# Creating, changing or deleting a profile changes its user's cached role
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+@receiver(post_save, sender=NGO)
+@receiver(post_delete, sender=NGO)
+def invalidate_user_role(sender, instance, **kwargs):
+    if instance.user_id is not None:
+        transaction.on_commit(partial(forget_user_role, instance.user_id))
+
+
+# Logging out deletes the token, which must stop authenticating immediately
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    transaction.on_commit(partial(forget_token, instance.key))
+
+
+# A changed user (e.g. deactivated) must not keep authenticating from a stale cached copy
+@receiver(post_save, sender=User)
+def invalidate_cached_user_tokens(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    for key in Token.objects.filter(user_id=instance.pk).values_list("key", flat=True):
+        transaction.on_commit(partial(forget_token, key))
@@ -0,0 +1,883 @@
+import io
+import json
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipIf
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
+from django.db.models.deletion import Collector
+from django.http import QueryDict
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .authentication import _token_cache_key
+from .checks import check_jwt_blacklist_cache, check_token_cache
+from .geo import GeocoderUnavailable, NominatimGeocoder, geocode, geocode_rows
+from .metrics import RequestMetrics, current_request, registry, timed_serialization
+from .models import NGO, ArchivedFoodClaim, DonationDailyRollup, FoodClaim, FoodListing, Restaurant
+from .partitions import (
+    DEFAULT_PARTITION,
+    is_partitioned,
+    month_start,
+    next_month,
+    partition_food_claims,
+    partition_name,
+    unpartition_food_claims,
+)
+from .renderers import FastJSONParser, FastJSONRenderer
+from .serializers import UserSerializer
+from .services import ClaimConflict, claim_food_listing, claim_food_listings
+from . import views
+
+
+def create_restaurant(name="Restaurant"):
+    user = User.objects.create_user(username=f"{name.lower()}-user")
+    return Restaurant.objects.create(user=user, name=name, address="1 Main St", email=f"{name.lower()}@example.com", phone="1")
+
+
+def create_ngo(name="NGO"):
+    user = User.objects.create_user(username=f"{name.lower()}-user")
+    return NGO.objects.create(user=user, name=name, address="2 Main St", email=f"{name.lower()}@example.com", phone="2")
+
+
+def create_listing(restaurant, total_quantity=10, food_name="Rice", **kwargs):
+    return FoodListing.objects.create(
+        restaurant=restaurant,
+        food_name=food_name,
+        total_quantity=total_quantity,
+        available_pickup_times="5pm",
+        pickup_address="1 Main St",
+        **kwargs,
+    )
+
+
+def client_for(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION="Token " + Token.objects.create(user=user).key)
+    return client
+
+
+class ClaimFoodTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.restaurant = create_restaurant()
+        self.ngo = create_ngo()
+        self.listing = create_listing(self.restaurant)
+        self.client = client_for(self.ngo.user)
+
+    def claim(self, quantity):
+        return self.client.post(
+            "/api/claim-food/", {"food_listing": self.listing.pk, "claimed_quantity": quantity}, format="json"
+        )
+
+    def test_claim_updates_counters(self):
+        self.assertEqual(self.claim(4).status_code, 201)
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.claimed_quantity, self.listing.remaining_quantity), (4, 6))
+        self.assertEqual(self.listing.status, "partially claimed")
+
+    def test_over_claim_is_a_conflict(self):
+        self.assertEqual(self.claim(4).status_code, 201)
+        response = self.claim(7)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["detail"], "Not enough food remaining. Only 6 available.")
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.remaining_quantity, 6)
+        self.assertEqual(FoodClaim.objects.count(), 1)
+
+    def test_claiming_the_rest_closes_the_listing(self):
+        self.assertEqual(self.claim(10).status_code, 201)
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.status, "claimed")
+        self.assertEqual(self.claim(1).status_code, 409)
+
+    def test_stale_instance_cannot_over_claim(self):
+        # The reservation is checked in the database, not against the in-memory counters
+        stale = FoodListing.objects.get(pk=self.listing.pk)
+        claim_food_listing(self.ngo.pk, self.listing, 8)
+        with self.assertRaises(ClaimConflict):
+            claim_food_listing(self.ngo.pk, stale, 8)
+        self.assertEqual(FoodClaim.objects.count(), 1)
+
+    def test_saving_a_stale_listing_keeps_the_claims(self):
+        # An edit made from an instance loaded before a claim (e.g. in the admin)
+        stale = FoodListing.objects.get(pk=self.listing.pk)
+        claim_food_listing(self.ngo.pk, self.listing, 3)
+        stale.food_name = "Fried rice"
+        stale.total_quantity = 5
+        stale.save()
+        self.listing.refresh_from_db()
+        self.assertEqual(self.listing.food_name, "Fried rice")
+        self.assertEqual((self.listing.claimed_quantity, self.listing.remaining_quantity), (3, 2))
+        self.assertEqual(self.listing.status, "partially claimed")
+        self.assertEqual((stale.claimed_quantity, stale.remaining_quantity), (3, 2))
+
+        stale.total_quantity = 3
+        stale.save()
+        self.listing.refresh_from_db()
+        self.assertEqual((self.listing.remaining_quantity, self.listing.status), (0, "claimed"))
+
+
+class BatchClaimTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ngo = create_ngo()
+        self.client = client_for(self.ngo.user)
+        # Listing pks run against restaurant pks, so listing order isn't rollup order
+        self.low = create_restaurant("Low")
+        self.high = create_restaurant("High")
+        self.first = create_listing(self.high, total_quantity=5)
+        self.second = create_listing(self.low, total_quantity=5)
+
+    def claim(self, *quantities):
+        return self.client.post(
+            "/api/claim-food/batch/",
+            {"claims": [{"food_listing": pk, "claimed_quantity": quantity} for pk, quantity in quantities]},
+            format="json",
+        )
+
+    def assertNothingClaimed(self):
+        self.assertFalse(FoodClaim.objects.exists())
+        self.assertFalse(DonationDailyRollup.objects.exists())
+        for listing in (self.first, self.second):
+            listing.refresh_from_db()
+            self.assertEqual((listing.claimed_quantity, listing.remaining_quantity, listing.status), (0, 5, "available"))
+
+    def test_batch_claims_every_listing(self):
+        response = self.claim((self.first.pk, 2), (self.second.pk, 5))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["claims"]), 2)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.remaining_quantity, self.first.status), (3, "partially claimed"))
+        self.assertEqual((self.second.remaining_quantity, self.second.status), (0, "claimed"))
+        self.assertEqual(
+            sorted(DonationDailyRollup.objects.values_list("restaurant", "claims_count", "quantity")),
+            sorted([(self.high.pk, 1, 2), (self.low.pk, 1, 5)]),
+        )
+
+    def test_any_shortfall_rolls_back_the_batch(self):
+        response = self.claim((self.first.pk, 2), (self.second.pk, 6))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            response.data["shortfalls"],
+            [{"food_listing": self.second.pk, "claimed_quantity": 6, "remaining_quantity": 5}],
+        )
+        self.assertNothingClaimed()
+
+    def test_unknown_listing_rolls_back_the_batch(self):
+        response = self.claim((self.first.pk, 2), (self.second.pk + 100, 1))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("food_listing", response.data)
+        self.assertNothingClaimed()
+
+    def test_expired_listing_rolls_back_the_batch(self):
+        FoodListing.objects.filter(pk=self.second.pk).update(pickup_window_end=timezone.now())
+        response = self.claim((self.first.pk, 2), (self.second.pk, 1))
+        self.assertEqual(response.status_code, 409)
+        self.assertNothingClaimed()
+
+    def test_repeated_listing_is_rejected(self):
+        self.assertEqual(self.claim((self.first.pk, 1), (self.first.pk, 1)).status_code, 400)
+        self.assertNothingClaimed()
+
+    def test_rollups_are_incremented_in_day_and_restaurant_order(self):
+        with mock.patch.object(DonationDailyRollup, "add_claims") as add_claims:
+            self.assertEqual(self.claim((self.first.pk, 1), (self.second.pk, 1)).status_code, 201)
+        self.assertEqual(
+            [call.args[1] for call in add_claims.call_args_list],
+            [self.low.pk, self.high.pk],
+        )
+
+
+@skipIf(connection.vendor == "sqlite", "SQLite serializes writers, so there is no race to test")
+class ConcurrentClaimTests(TransactionTestCase):
+    def claimants(self, wanted=200):
+        # Each thread holds its own connection; leave a few for the test itself
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW max_connections")
+            max_connections = int(cursor.fetchone()[0])
+        return max(2, min(wanted, max_connections - 10))
+
+    def test_concurrent_claims_never_over_claim(self):
+        # Hundreds of NGOs claim the same listing at once; only its quantity succeeds
+        count = self.claimants()
+        restaurant = create_restaurant()
+        ngos = [create_ngo(f"NGO{i}") for i in range(count)]
+        listing = create_listing(restaurant, total_quantity=count // 4)
+        results = []
+        barrier = threading.Barrier(count, timeout=60)
+
+        def claim(ngo):
+            try:
+                stale = FoodListing.objects.get(pk=listing.pk)
+                barrier.wait()
+                claim_food_listing(ngo.pk, stale, 1)
+                results.append(True)
+            except ClaimConflict:
+                results.append(False)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=claim, args=(ngo,)) for ngo in ngos]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        listing.refresh_from_db()
+        self.assertEqual(len(results), count)
+        self.assertEqual(results.count(True), count // 4)
+        self.assertEqual((listing.claimed_quantity, listing.remaining_quantity), (count // 4, 0))
+        self.assertEqual(listing.status, "claimed")
+        self.assertEqual(FoodClaim.objects.count(), count // 4)
+
+    def test_crossed_batches_do_not_deadlock(self):
+        # Listings in pk order: a and d belong to one restaurant, b and c to the other, so
+        # in listing order the two batches would take the rollup rows in opposite orders
+        first, second = create_restaurant("First"), create_restaurant("Second")
+        a, b, c, d = (create_listing(restaurant, total_quantity=100) for restaurant in (first, second, second, first))
+        for restaurant in (first, second):
+            DonationDailyRollup.add_claims(timezone.localdate(), restaurant.pk, 0, 0)
+        ngo = create_ngo()
+        errors = []
+        barrier = threading.Barrier(2)
+
+        def claim(quantities):
+            try:
+                for _ in range(20):
+                    barrier.wait()
+                    claim_food_listings(ngo.pk, quantities)
+            except Exception as exc:
+                errors.append(exc)
+                barrier.abort()
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=claim, args=({a.pk: 1, b.pk: 1},)),
+            threading.Thread(target=claim, args=({c.pk: 1, d.pk: 1},)),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(FoodClaim.objects.count(), 80)
+
+
+
+@skipIf(connection.vendor != "postgresql", "Claim partitioning needs PostgreSQL")
+class ClaimPartitioningTests(TransactionTestCase):
+    def assertClaimsTableIntact(self):
+        # The CHECK constraint of the PositiveIntegerField and Django's foreign key indexes
+        constraints = connection.introspection.get_constraints(connection.cursor(), "base_foodclaim")
+        self.assertIn("base_foodclaim_claimed_quantity_check", constraints)
+        indexed = {tuple(c["columns"]) for c in constraints.values() if c["index"] and not c["primary_key"]}
+        self.assertLessEqual({("food_listing_id",), ("ngo_id",)}, indexed)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            FoodClaim.objects.update(claimed_quantity=-1)
+
+    def test_convert_and_back(self):
+        listing = create_listing(create_restaurant())
+        ngo = create_ngo()
+        claim_food_listing(ngo.pk, listing, 1)
+        old = timezone.now() - timedelta(days=70)
+        FoodClaim.objects.filter(pk=claim_food_listing(ngo.pk, listing, 1).pk).update(claimed_at=old)
+
+        with connection.schema_editor() as schema_editor:
+            partition_food_claims(schema_editor, FoodClaim, 1)
+        self.assertTrue(is_partitioned(connection))
+        self.assertClaimsTableIntact()
+        claim_food_listing(ngo.pk, listing, 1)
+        self.assertEqual(FoodClaim.objects.count(), 3)
+
+        # A claimed_at range only scans the partitions for its months
+        month = month_start(timezone.now().astimezone(dt_timezone.utc))
+        following = next_month(month)
+        plan = FoodClaim.objects.filter(
+            claimed_at__gte=datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc),
+            claimed_at__lt=datetime(following.year, following.month, 1, tzinfo=dt_timezone.utc),
+        ).explain()
+        self.assertIn(partition_name(month), plan)
+        self.assertNotIn(partition_name(month_start(old.astimezone(dt_timezone.utc))), plan)
+        self.assertNotIn(DEFAULT_PARTITION, plan)
+
+        with connection.schema_editor() as schema_editor:
+            unpartition_food_claims(schema_editor, FoodClaim)
+        self.assertFalse(is_partitioned(connection))
+        self.assertClaimsTableIntact()
+        self.assertEqual(FoodClaim.objects.count(), 3)
+
+
+class ListQueryCountTests(TestCase):
+    # The list endpoints must run a fixed number of queries however many rows they return.
+    # The cache is cleared before each request, so the counts include the token and role
+    # lookups a cold request makes
+
+    def setUp(self):
+        self.restaurant = create_restaurant()
+        self.ngo = create_ngo()
+        self.restaurant_client = client_for(self.restaurant.user)
+        self.ngo_client = client_for(self.ngo.user)
+        self.add_rows(0)
+
+    def add_rows(self, start, count=3):
+        for i in range(start, start + count):
+            listing = create_listing(self.restaurant)
+            claim_food_listing(self.ngo.pk, listing, 1)
+            create_listing(create_restaurant(f"Other{i}"))
+            create_ngo(f"OtherNGO{i}")
+
+    def assertConstantQueries(self, client, path, expected):
+        cache.clear()
+        with self.assertNumQueries(expected):
+            self.assertEqual(client.get(path).status_code, 200)
+        self.add_rows(100 + FoodListing.objects.count())
+        cache.clear()
+        with self.assertNumQueries(expected):
+            self.assertEqual(client.get(path).status_code, 200)
+
+    def test_food_listings(self):
+        self.assertConstantQueries(self.ngo_client, "/api/food-listings/", 1)
+
+    def test_ngos(self):
+        self.assertConstantQueries(self.ngo_client, "/api/ngos/", 2)
+
+    def test_restaurant_donations(self):
+        self.assertConstantQueries(self.restaurant_client, "/api/donations/", 4)
+
+    def test_ngo_claims(self):
+        self.assertConstantQueries(self.ngo_client, "/api/claims/", 5)
+
+
+class RestaurantSerializerQueryTests(TestCase):
+    # The restaurant endpoints prefetch the live listings of every restaurant, so they run
+    # a fixed number of queries however many listings and claims each restaurant has
+
+    def setUp(self):
+        cache.clear()
+        self.ngo = create_ngo()
+        self.client = client_for(self.ngo.user)
+        self.restaurant = create_restaurant()
+        self.expected = {self.restaurant.pk: self.add_listings(self.restaurant, 3)}
+
+    def add_listings(self, restaurant, count):
+        # Returns the ids of the live listings, newest first. Every third listing is fully
+        # claimed and every fourth partially claimed; an expired one is added as well
+        live = []
+        for i in range(count):
+            listing = create_listing(restaurant, total_quantity=4)
+            if i % 3 == 2:
+                claim_food_listing(self.ngo.pk, listing, 4)
+                continue
+            if i % 4 == 3:
+                claim_food_listing(self.ngo.pk, listing, 1)
+            live.append(listing.pk)
+        create_listing(restaurant, status="expired")
+        return live[::-1]
+
+    def add_restaurants(self):
+        for count in (0, 1, 7):
+            restaurant = create_restaurant(f"Restaurant{count}")
+            self.expected[restaurant.pk] = self.add_listings(restaurant, count)
+
+    def get(self, path, queries):
+        cache.clear()
+        with self.assertNumQueries(queries):
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def assertLiveListings(self, restaurant):
+        listings = restaurant["food_listings"]
+        self.assertEqual([listing["id"] for listing in listings], self.expected[restaurant["id"]])
+        for listing in listings:
+            claimed = FoodClaim.objects.filter(food_listing_id=listing["id"]).aggregate(total=Sum("claimed_quantity"))
+            self.assertEqual(listing["remaining_quantity"], 4 - (claimed["total"] or 0))
+
+    def test_restaurant_list(self):
+        # Token, restaurants with their users, their live listings
+        for restaurant in self.get("/api/restaurants/", 3):
+            self.assertLiveListings(restaurant)
+        self.add_restaurants()
+        restaurants = self.get("/api/restaurants/", 3)
+        self.assertEqual(len(restaurants), 4)
+        for restaurant in restaurants:
+            self.assertLiveListings(restaurant)
+
+    def test_restaurant_detail(self):
+        path = f"/api/restaurants/{self.restaurant.pk}/"
+        self.assertLiveListings(self.get(path, 2))
+        # The new listings come first
+        self.expected[self.restaurant.pk][:0] = self.add_listings(self.restaurant, 10)
+        self.assertLiveListings(self.get(path, 2))
+
+
+@skipIf(connection.vendor != "postgresql", "SQLite can't match bound parameters to the partial index conditions")
+class IndexUsageTests(TestCase):
+    # The hot list queries must be answered from their indexes. The plans come from
+    # EXPLAIN over a seeded dataset, after ANALYZE, so the planner chooses between the
+    # index and a full scan on real statistics
+
+    @classmethod
+    def setUpTestData(cls):
+        restaurants = [create_restaurant(f"Restaurant{i}") for i in range(20)]
+        ngos = [create_ngo(f"NGO{i}") for i in range(40)]
+        statuses = ["available", "available", "partially claimed", "claimed", "expired"]
+        FoodListing.objects.bulk_create(
+            FoodListing(
+                # Half of them from one large restaurant
+                restaurant=restaurants[0 if i % 2 else i % len(restaurants)],
+                food_name="Rice",
+                total_quantity=10,
+                remaining_quantity=10,
+                available_pickup_times="5pm",
+                pickup_address="1 Main St",
+                status=statuses[i % len(statuses)],
+            )
+            for i in range(5000)
+        )
+        listings = list(FoodListing.objects.values_list("pk", flat=True))
+        # Spread the claims over two years, one every hour (claimed_at is set on insert)
+        cls.now = timezone.now()
+        claimed_at = (cls.now - timedelta(hours=i) for i in range(20000))
+        with mock.patch("django.utils.timezone.now", side_effect=claimed_at):
+            FoodClaim.objects.bulk_create(
+                FoodClaim(food_listing_id=listings[i * 7 % len(listings)], ngo=ngos[i % len(ngos)], claimed_quantity=1)
+                for i in range(20000)
+            )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        cls.restaurant = restaurants[0]
+        cls.ngo = ngos[0]
+        cls.listing = FoodListing.objects.get(pk=listings[0])
+
+    def assertUsesIndex(self, queryset, *indexes):
+        # Scanned through one of the indexes, not the whole table
+        plan = queryset.explain()
+        self.assertTrue(any(re.search(rf"Scan (using|on) {index} ", plan) for index in indexes), plan)
+        self.assertNotIn("Seq Scan", plan)
+
+    def test_listing_feeds(self):
+        listings = FoodListing.objects.order_by("-created_at", "-id")
+        self.assertUsesIndex(
+            views.filter_food_listings(listings, QueryDict())[:20], "foodlisting_live_created_idx"
+        )
+        self.assertUsesIndex(
+            views.filter_food_listings(listings, QueryDict("status=expired"))[:20], "foodlisting_status_created_idx"
+        )
+        self.assertUsesIndex(
+            views.filter_food_listings(listings, QueryDict(f"status=claimed&restaurant={self.restaurant.pk}"))[:20],
+            "foodlisting_status_created_idx",
+            "foodlisting_rest_created_idx",
+        )
+
+    def test_claim_histories(self):
+        claims = FoodClaim.objects.order_by("-claimed_at", "-id")
+        self.assertUsesIndex(claims.filter(ngo=self.ngo)[:20], "foodclaim_ngo_claimed_idx")
+        self.assertUsesIndex(claims.filter(food_listing=self.listing)[:20], "foodclaim_listing_claimed_idx")
+        # Date ranges (?claimed_after=, the rollup rebuild, recent donations) are sargable
+        week = claims.filter(claimed_at__gte=self.now - timedelta(days=7), claimed_at__lt=self.now)
+        self.assertUsesIndex(week, "foodclaim_claimed_idx")
+
+
+class DateParameterTests(TestCase):
+    def setUp(self):
+        self.ngo = create_ngo()
+        self.client = client_for(self.ngo.user)
+
+    def test_invalid_calendar_dates_are_bad_requests(self):
+        for path, name in [
+            ("/api/claims/?claimed_after=2024-02-30T10:00", "claimed_after"),
+            ("/api/claims/?claimed_before=2024-13-45", "claimed_before"),
+            ("/api/food-listings/?created_after=2024-13-45", "created_after"),
+        ]:
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(name, response.json())
+
+    def test_claimed_range_filters_claims(self):
+        listing = create_listing(create_restaurant())
+        claim_food_listing(self.ngo.pk, listing, 1)
+        self.assertEqual(len(self.client.get("/api/claims/?claimed_after=2000-01-01").json()["results"]), 1)
+        self.assertEqual(len(self.client.get("/api/claims/?claimed_before=2000-01-01").json()["results"]), 0)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.restaurant = create_restaurant()
+
+    def search(self, query):
+        response = self.client.get("/api/food-listings/", {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return [listing["food_name"] for listing in response.json()["results"]]
+
+    def test_new_and_edited_listings_are_found(self):
+        listing = create_listing(self.restaurant, food_name="Chicken curry")
+        create_listing(self.restaurant, food_name="Rice")
+        self.assertEqual(self.search("curry"), ["Chicken curry"])
+        listing.food_name = "Lentil soup"
+        listing.save()
+        self.assertEqual(self.search("curry"), [])
+        self.assertEqual(self.search("soup"), ["Lentil soup"])
+
+    @skipIf(connection.vendor not in ("postgresql", "sqlite"), "Other databases fall back to unranked icontains")
+    def test_food_name_matches_rank_first(self):
+        create_listing(self.restaurant, food_name="Rice", special_instructions="Goes well with the curry")
+        create_listing(self.restaurant, food_name="Curry")
+        self.assertEqual(self.search("curry"), ["Curry", "Rice"])
+        self.assertEqual(self.search("rice curry"), ["Rice"])
+
+    def test_claimed_listings_are_hidden(self):
+        claimed = create_listing(self.restaurant, food_name="Curry", total_quantity=1)
+        claim_food_listing(create_ngo().pk, claimed, 1)
+        self.assertEqual(self.search("curry"), [])
+        response = self.client.get("/api/food-listings/", {"q": "curry", "status": "claimed"})
+        self.assertEqual(len(response.json()["results"]), 1)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ngo = create_ngo()
+        self.token = Token.objects.create(user=self.ngo.user).key
+        listing = create_listing(create_restaurant())
+        for _ in range(3):
+            claim_food_listing(self.ngo.pk, listing, 1)
+
+    def test_csv_export(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        response = client.get("/api/claims/export/?format=csv")
+        self.assertEqual(response.status_code, 200)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+
+
+class AsyncExportTests(TransactionTestCase):
+    # ASGI requests run their queries in their own thread, so the data has to be committed
+
+    def setUp(self):
+        ExportTests.setUp(self)
+
+    async def test_ndjson_export_streams_asynchronously_under_asgi(self):
+        response = await AsyncClient().get(
+            "/api/claims/export/?format=ndjson", headers={"Authorization": "Token " + self.token}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(content.decode().splitlines()), 3)
+
+
+class RendererParityTests(SimpleTestCase):
+    # FastJSONRenderer and FastJSONParser must behave exactly like DRF's JSON classes
+    values = [
+        {"name": "Rice", "quantity": 10, "nested": {"list": [1, 2.5, None, True, False]}, "tuple": (1, "a")},
+        {"text": "café ☕ \u2028 \u2029 \"quoted\" \\ \n \x00", 1: "int key", None: "none key", True: "bool key"},
+        {"aware": datetime(2026, 10, 18, 12, 30, 5, 123456, tzinfo=dt_timezone.utc)},
+        {"offset": datetime(2026, 10, 18, 12, 30, tzinfo=dt_timezone(timedelta(hours=-5)))},
+        {"naive": datetime(2026, 10, 18, 12, 30), "date": datetime(2026, 10, 18).date()},
+        {"time": datetime(2026, 10, 18, 12, 30, 5, 5).time(), "duration": timedelta(hours=1, seconds=5)},
+        {"decimal": Decimal("12.50"), "uuid": uuid.UUID(int=1), "lazy": gettext_lazy("Food")},
+        [0.1, 1 / 3, -0.0, 0.0, 1e15, 9999.5, 0.0001, -0.0001, 12345.678],
+        # The stdlib writes these in exponent notation
+        [1e16, 1e20, -1e20, 1.5e300, 9.9e-5, 1e-5, 1.5e-7, 5e-324],
+        [2 ** 63 - 1, -(2 ** 63), 2 ** 64 - 1, 2 ** 64, -(2 ** 63) - 1, 10 ** 30],
+        [{"distance_km": 1e-5}, ({"id": 2 ** 70},)],
+        [],
+        {},
+        "",
+        0,
+        None,
+    ]
+
+    def test_rendered_bytes_match(self):
+        for value in self.values:
+            with self.subTest(value=value):
+                self.assertEqual(FastJSONRenderer().render(value), JSONRenderer().render(value))
+
+    def test_non_finite_floats_raise_like_drf(self):
+        for value in (float("nan"), float("inf"), [{"distance_km": float("-inf")}], {"d": Decimal("NaN")}):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    JSONRenderer().render(value)
+                with self.assertRaises(ValueError):
+                    FastJSONRenderer().render(value)
+
+    def test_parsed_data_matches(self):
+        bodies = [
+            b'{"food_name": "Rice", "quantity": 10, "items": [1, 2.5, null, true, false]}',
+            '{"text": "café \\u2028 \\ud83c\\udf5a"}'.encode(),
+            b'[123456789012345678901234567890, -98765432109876543210, 18446744073709551615]',
+            b'[1e400, -1e400, 1e-400, 0.1, 1e20]',
+            b'"\\ud800"',
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+
+    def test_invalid_bodies_raise_like_drf(self):
+        for body in (b'{"a": 1', b'NaN', b'[Infinity]', b'\xff', b''):
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError) as expected:
+                    JSONParser().parse(io.BytesIO(body))
+                with self.assertRaises(ParseError) as raised:
+                    FastJSONParser().parse(io.BytesIO(body))
+                self.assertEqual(str(raised.exception), str(expected.exception))
+
+
+class MetricsTests(TestCase):
+    def test_metrics_need_staff_without_token(self):
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 401)
+        self.client.force_login(User.objects.create_user(username="user"))
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 401)
+        self.client.force_login(User.objects.create_user(username="staff", is_staff=True))
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 200)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_need_token_when_set(self):
+        self.client.force_login(User.objects.create_user(username="staff", is_staff=True))
+        self.assertEqual(self.client.get("/api/metrics/").status_code, 401)
+        response = self.client.get("/api/metrics/", headers={"Authorization": "Bearer secret"})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(RESPONSE_CACHE_TTLS={})
+    def test_serialization_time_covers_building_the_response_data(self):
+        create_listing(create_restaurant())
+        to_representation = UserSerializer.to_representation
+
+        def slow_to_representation(serializer, instance):
+            time.sleep(0.05)
+            return to_representation(serializer, instance)
+
+        with mock.patch.object(UserSerializer, "to_representation", slow_to_representation):
+            response = self.client.get("/api/restaurants/")
+        timings = dict(re.findall(r"(\w+);dur=([\d.]+)", response["Server-Timing"]))
+        self.assertGreaterEqual(float(timings["serialize"]), 50)
+
+    def test_serialization_time_excludes_queries_and_nested_blocks(self):
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(0.2)
+            return execute(sql, params, many, context)
+
+        metrics = RequestMetrics(keep_sql=False)
+        token = current_request.set(metrics)
+        try:
+            with connection.execute_wrapper(metrics), connection.execute_wrapper(slow_query):
+                with timed_serialization():
+                    with timed_serialization():
+                        time.sleep(0.02)
+                    User.objects.count()
+        finally:
+            current_request.reset(token)
+        self.assertGreaterEqual(metrics.db_time, 0.2)
+        self.assertGreaterEqual(metrics.serialization_time, 0.02)
+        self.assertLess(metrics.serialization_time, 0.2)
+
+    def test_streamed_queries_are_counted(self):
+        ExportTests.setUp(self)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION="Token " + self.token)
+        with mock.patch.object(registry, "observe") as observe, CaptureQueriesContext(connection) as queries:
+            response = client.get("/api/claims/export/?format=csv")
+            observe.assert_not_called()
+            b"".join(response.streaming_content)
+        view, method, values = observe.call_args.args
+        self.assertEqual((view, method), ("ngo_claims_export", "GET"))
+        self.assertEqual(values["everybodyeats_request_queries"], len(queries))
+
+
+class ArchivedHistoryTests(TestCase):
+    def setUp(self):
+        self.restaurant = create_restaurant()
+        self.ngo = create_ngo()
+        now = timezone.now()
+        old = create_listing(self.restaurant, total_quantity=2)
+        live = create_listing(self.restaurant)
+        # Claim times interleave across the listing that gets archived and the live one
+        self.claim_ids = []
+        for listing, days_ago in ((old, 2), (old, 5), (live, 7)):
+            claim = claim_food_listing(self.ngo.pk, listing, 1)
+            FoodClaim.objects.filter(pk=claim.pk).update(claimed_at=now - timedelta(days=days_ago))
+            self.claim_ids.append(claim.pk)
+        FoodListing.objects.filter(pk=old.pk).update(created_at=now - timedelta(days=10))
+        call_command("archive_food_listings", days=1, stdout=io.StringIO())
+        self.assertEqual(ArchivedFoodClaim.objects.count(), 2)
+
+    def test_histories_include_archived_claims_in_order(self):
+        for user, path in ((self.ngo.user, "/api/claims/"), (self.restaurant.user, "/api/donations/")):
+            with self.subTest(path=path):
+                client = client_for(user)
+                ids = []
+                url = path + "?page_size=1"
+                while url:
+                    page = client.get(url).json()
+                    ids.extend(claim["id"] for claim in page["results"])
+                    url = page["next"]
+                self.assertEqual(ids, self.claim_ids)
+
+    def test_exports_include_archived_claims(self):
+        client = client_for(self.ngo.user)
+        response = client.get("/api/claims/export/?format=ndjson")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row["id"] for row in rows], self.claim_ids)
+        self.assertEqual({row["restaurant_name"] for row in rows}, {"Restaurant"})
+
+
+@override_settings(AUTH_TOKEN_CACHE_TTL=300)
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.ngo = create_ngo()
+        self.ngo.user.set_password("pw12345!")
+        self.ngo.user.save()
+        self.client = client_for(self.ngo.user)
+
+    def test_cache_keeps_no_password_hash(self):
+        self.assertEqual(self.client.get("/api/claims/").status_code, 200)
+        key = _token_cache_key(Token.objects.get(user=self.ngo.user).key)
+        self.assertNotIn("password", cache.get(key))
+        with self.assertNumQueries(2):
+            # Authenticated from the cache; only the live and archived claims queries run
+            self.assertEqual(self.client.get("/api/claims/").status_code, 200)
+
+    def test_deleted_token_stops_authenticating(self):
+        self.assertEqual(self.client.get("/api/claims/").status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post("/api/logout/").status_code, 200)
+        self.assertEqual(self.client.get("/api/claims/").status_code, 401)
+
+
+class CacheBackendCheckTests(SimpleTestCase):
+    def test_token_cache_warns_only_when_enabled_on_local_memory(self):
+        with self.settings(AUTH_TOKEN_CACHE_TTL=0):
+            self.assertEqual(check_token_cache(None), [])
+        with self.settings(AUTH_TOKEN_CACHE_TTL=300):
+            self.assertEqual([warning.id for warning in check_token_cache(None)], ["base.W001"])
+
+    def test_jwt_blacklist_refuses_a_local_memory_cache(self):
+        with self.settings(JWT_AUTH_ENABLED=True):
+            self.assertEqual([error.id for error in check_jwt_blacklist_cache(None)], ["base.E001"])
+        shared = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://"}}
+        with self.settings(JWT_AUTH_ENABLED=True, CACHES=shared):
+            self.assertEqual(check_jwt_blacklist_cache(None), [])
+
+
+class RecordingGeocoder:
+    calls = []
+
+    def geocode(self, address):
+        RecordingGeocoder.calls.append(address)
+        return (1.5, 2.5) if address == "known" else None
+
+
+@override_settings(GEOCODER="base.tests.RecordingGeocoder")
+class GeocodingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        RecordingGeocoder.calls = []
+        self.restaurant = create_restaurant()
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(latitude=10.0, longitude=20.0)
+        self.client = client_for(self.restaurant.user)
+
+    def test_bulk_create_does_not_wait_on_the_geocoder(self):
+        items = [
+            {"food_name": "Rice", "total_quantity": 5, "available_pickup_times": "5pm", "pickup_address": address}
+            for address in ("known", "unknown")
+        ]
+        response = self.client.post("/api/food-listings/bulk/", items, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(RecordingGeocoder.calls, [])
+
+        listings = FoodListing.objects.order_by("pk")
+        self.assertEqual(
+            [(listing.latitude, listing.longitude, listing.location_pending) for listing in listings],
+            [(10.0, 20.0, True), (10.0, 20.0, True)],
+        )
+        geocode_rows(FoodListing.objects.filter(location_pending=True), "pickup_address")
+        self.assertEqual(
+            [(listing.latitude, listing.longitude, listing.location_pending) for listing in listings.all()],
+            [(1.5, 2.5, False), (10.0, 20.0, False)],
+        )
+
+    def test_cached_addresses_are_located_immediately(self):
+        geocode("known")
+        RecordingGeocoder.calls = []
+        response = self.client.post(
+            "/api/food-listings/",
+            {"food_name": "Rice", "total_quantity": 5, "available_pickup_times": "5pm", "pickup_address": "known"},
+            format="json",
+        )
+        self.assertEqual((response.data["latitude"], response.data["longitude"]), (1.5, 2.5))
+        self.assertFalse(FoodListing.objects.get().location_pending)
+        self.assertEqual(RecordingGeocoder.calls, [])
+
+    def test_malformed_nominatim_response_is_unavailable(self):
+        for body in (b"[{}]", b"not json", b"[]"):
+            with self.subTest(body=body), mock.patch("base.geo.urlopen") as urlopen:
+                urlopen.return_value.__enter__.return_value = io.BytesIO(body)
+                geocoder = NominatimGeocoder()
+                geocoder.min_interval = 0
+                if body == b"[]":
+                    self.assertIsNone(geocoder.geocode("somewhere"))
+                else:
+                    with self.assertRaises(GeocoderUnavailable):
+                        geocoder.geocode("somewhere")
+
+
+class SignalTests(SimpleTestCase):
+    def test_unrelated_models_keep_fast_deletes(self):
+        collector = Collector(using="default")
+        self.assertTrue(collector.can_fast_delete(Session.objects.all()))
+        self.assertTrue(collector.can_fast_delete(ArchivedFoodClaim.objects.all()))
+
+
+class DonationRollupTests(TestCase):
+    def test_claims_without_a_restaurant_share_one_row_per_day(self):
+        day = timezone.localdate()
+        DonationDailyRollup.add_claims(day, None, 2)
+        DonationDailyRollup.add_claims(day, None, 3)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DonationDailyRollup.objects.create(day=day, restaurant=None)
+        row = DonationDailyRollup.objects.get(day=day, restaurant=None)
+        self.assertEqual((row.claims_count, row.quantity), (2, 5))
+
+    def test_rebuild_counts_live_and_archived_claims(self):
+        ngo = create_ngo()
+        restaurants = [create_restaurant(f"R{i}") for i in range(3)]
+        for restaurant in restaurants:
+            listing = create_listing(restaurant, total_quantity=3)
+            claim_food_listing(ngo.pk, listing, 1)
+            claim_food_listing(ngo.pk, listing, 2)
+        FoodListing.objects.filter(restaurant=restaurants[0]).update(created_at=timezone.now() - timedelta(days=10))
+        call_command("archive_food_listings", days=1, stdout=io.StringIO())
+        DonationDailyRollup.objects.update(claims_count=0, quantity=0)
+
+        # One invalidation for the whole table, not one per deleted row
+        with self.captureOnCommitCallbacks() as callbacks:
+            call_command("rebuild_donation_rollups", stdout=io.StringIO())
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(
+            sorted(DonationDailyRollup.objects.values_list("restaurant", "claims_count", "quantity")),
+            [(restaurant.pk, 2, 3) for restaurant in restaurants],
+        )
@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .roles import get_user_role
+
+
+def _blacklist_key(token):
+    return f"jwt-blacklist:{token[api_settings.JTI_CLAIM]}"
+
+
+def blacklist_token(token):
+    # Revoked tokens only need to be remembered until they would have expired anyway
+    remaining = int(token["exp"] - time.time())
+    if remaining > 0:
+        caches[settings.JWT_BLACKLIST_CACHE_ALIAS].set(_blacklist_key(token), True, remaining)
+
+
+def is_blacklisted(token):
+    return caches[settings.JWT_BLACKLIST_CACHE_ALIAS].get(_blacklist_key(token)) is not None
+
+
+# Login serializer whose tokens carry the user's role and profile id, so authenticated
+# requests never need to look them up
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token["role"], token["profile_id"] = get_user_role(user)
+        return token
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        data["role"], _ = get_user_role(self.user)
+        return data
+
+
+class BlacklistAwareTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        if is_blacklisted(RefreshToken(attrs["refresh"])):
+            raise InvalidToken("Token is blacklisted")
+        return super().validate(attrs)
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Authenticates "Bearer <access token>" requests from the token alone: no user or role
+    lookup, only a cache check against the logout blacklist.
+    """
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_blacklisted(token):
+            raise InvalidToken("Token is blacklisted")
+        return token
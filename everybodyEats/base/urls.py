@@ -1,10 +1,16 @@
+from django.conf import settings
 from django.urls import path
-from .views import FoodListingView, RestaurantRegistrationView, RestaurantListView, NGORegistrationView, NGOListView, ClaimFoodView, logout_view, RestaurantDetailView, RestaurantDonationsView, NGOClaimsView, CustomAuthToken, CustomObtainAuthToken, DonationStatisticsView, MonthlyDonationStatsView
+from .views import BulkFoodListingView, RestaurantRegistrationView, RestaurantListView, NGORegistrationView, NGOListView, ClaimFoodView, BatchClaimFoodView, logout_view, RestaurantDonationsView, NGOClaimsView, CustomAuthToken, CustomObtainAuthToken, JWTLoginView, JWTRefreshView, FoodListingExportView, RestaurantDonationsExportView, NGOClaimsExportView, MonthlyDonationStatsExportView, metrics_view
+from .async_views import FoodListingView, FoodListingEventsView, NearbyFoodListingView, RestaurantDetailView, DonationStatisticsView, MonthlyDonationStatsView
 from rest_framework.authtoken.views import obtain_auth_token
 
 urlpatterns = [
     # Food Listings (for restaurants)
     path("food-listings/", FoodListingView.as_view(), name="food_listings"),
+    path("food-listings/bulk/", BulkFoodListingView.as_view(), name="food_listings_bulk"),
+    path("food-listings/nearby/", NearbyFoodListingView.as_view(), name="food_listings_nearby"),
+    path("food-listings/events/", FoodListingEventsView.as_view(), name="food_listings_events"),
+    path("food-listings/export/", FoodListingExportView.as_view(), name="food_listings_export"),
     # Restaurant Routes
     path(
         "register-restaurant/",
@@ -22,17 +28,31 @@ urlpatterns = [
     path("ngos/", NGOListView.as_view(), name="ngo_list"),
     # Claim and Update Donation Routes
     path('claim-food/', ClaimFoodView.as_view(), name='claim_food_listing'),
+    path('claim-food/batch/', BatchClaimFoodView.as_view(), name='claim_food_listings_batch'),
     
     path('login/', CustomAuthToken.as_view(), name='custom_auth_token'),  # Login to get the token
     path('logout/', logout_view, name='logout'),  # Logout to delete token
     
     # Get past donations by a restaurant
     path('donations/', RestaurantDonationsView.as_view(), name='restaurant_donations'),
+    path('donations/export/', RestaurantDonationsExportView.as_view(), name='restaurant_donations_export'),
 
     # Get past claims by an NGO
     path('claims/', NGOClaimsView.as_view(), name='ngo_claims'),
+    path('claims/export/', NGOClaimsExportView.as_view(), name='ngo_claims_export'),
     
     # Get statistics
     path('donation-statistics/', DonationStatisticsView.as_view(), name='donation_statistics'),
     path('monthly-donations/', MonthlyDonationStatsView.as_view(), name='monthly_donations'),
+    path('monthly-donations/export/', MonthlyDonationStatsExportView.as_view(), name='monthly_donations_export'),
+
+    # Request metrics in Prometheus text format
+    path('metrics/', metrics_view, name='metrics'),
 ]
+
+if settings.JWT_AUTH_ENABLED:
+    urlpatterns += [
+        # Stateless JWT login/refresh (access tokens carry the user's role)
+        path('jwt/login/', JWTLoginView.as_view(), name='jwt_login'),
+        path('jwt/refresh/', JWTRefreshView.as_view(), name='jwt_refresh'),
+    ]
@@ -3,15 +3,35 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from .models import FoodListing, Restaurant, NGO, FoodClaim
-from .serializers import FoodListingSerializer, RestaurantSerializer, NGOSerializer, FoodClaimSerializer, FoodClaimDonationSerializer
+from .models import CLOSED_LISTING_STATUSES, FoodListing, Restaurant, NGO, FoodClaim, DonationDailyRollup
+from .serializers import FoodListingSerializer, RestaurantSerializer, NGOSerializer, FoodClaimSerializer, FoodClaimDonationSerializer, BatchClaimSerializer
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import api_view
 from rest_framework.permissions import AllowAny
 from rest_framework.authtoken.views import ObtainAuthToken
-from django.db.models import Sum, Count, Max
-from datetime import datetime, timedelta
+from rest_framework.exceptions import ValidationError
+from django.db.models import Prefetch, Sum
 from django.db.models.functions import TruncMonth
+from datetime import datetime, time
+from django.utils import timezone
+from django.http import Http404, HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.views.decorators.http import require_GET
+from django.conf import settings
+import hmac
+from django.utils.dateparse import parse_date, parse_datetime
+from .pagination import FoodClaimCursorPagination
+from .cache import cache_response
+from .exports import EXPORT_CHUNK_SIZE, CSVRenderer, NDJSONRenderer, streaming_export
+from .history import claim_history
+from .renderers import FastJSONRenderer
+from .metrics import registry
+from .permissions import IsNGO, IsRestaurant
+from .roles import get_user_role
+from .tokens import BlacklistAwareTokenRefreshSerializer, RoleTokenObtainPairSerializer, blacklist_token
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken, Token as JWTToken
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
 
 class CustomAuthToken(ObtainAuthToken):
@@ -21,22 +41,92 @@ class CustomAuthToken(ObtainAuthToken):
         user = serializer.validated_data['user']
         token, created = Token.objects.get_or_create(user=user)
 
-        # Determine user type (Restaurant or NGO)
-        user_type = None
-        if Restaurant.objects.filter(user=user).exists():
-            user_type = "restaurant"
-        elif NGO.objects.filter(user=user).exists():
-            user_type = "ngo"
+        # Determine user type (Restaurant or NGO) from the cached role mapping
+        user_type, _ = get_user_role(user)
 
         return Response({
             'token': token.key,
             'role': user_type
         })
 
-# View to list and create food listings (for restaurants)
-class FoodListingView(generics.ListCreateAPIView):
-    queryset = FoodListing.objects.all()
+def parse_datetime_param(params, name):
+    # Read an ISO 8601 date or datetime query parameter as an aware datetime (dates mean
+    # midnight); returns None when the parameter is absent
+    value = params.get(name)
+    if not value:
+        return None
+    # The parsers raise ValueError for well-formed but impossible dates (2024-02-30)
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            parsed_date = parse_date(value)
+            if parsed_date is not None:
+                parsed = datetime.combine(parsed_date, time.min)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: "Must be a valid ISO 8601 date or datetime."})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_number_param(params, name, minimum, maximum, default=None, cast=float):
+    # Read a numeric query parameter within [minimum, maximum]; returns the default when
+    # the parameter is absent (it is required when there is no default)
+    value = params.get(name)
+    if not value:
+        if default is None:
+            raise ValidationError({name: "This parameter is required."})
+        return default
+    try:
+        parsed = cast(value)
+    except ValueError:
+        raise ValidationError({name: "Must be a number."})
+    # Written so that NaN fails the check too
+    if not minimum <= parsed <= maximum:
+        raise ValidationError({name: f"Must be between {minimum} and {maximum}."})
+    return parsed
+
+
+def filter_food_listings(queryset, params):
+    # Fully claimed and expired listings are hidden unless a status is asked for explicitly
+    listing_status = params.get("status")
+    if listing_status:
+        queryset = queryset.filter(status=listing_status)
+    else:
+        queryset = queryset.exclude(status__in=CLOSED_LISTING_STATUSES)
+
+    restaurant_id = params.get("restaurant")
+    if restaurant_id:
+        if not restaurant_id.isdigit():
+            raise ValidationError({"restaurant": "Must be a restaurant id."})
+        queryset = queryset.filter(restaurant_id=restaurant_id)
+
+    created_after = parse_datetime_param(params, "created_after")
+    if created_after:
+        queryset = queryset.filter(created_at__gt=created_after)
+
+    return queryset
+
+
+# View to create food listings (for restaurants). /api/food-listings/ is routed to the
+# async view in async_views.py, which lists them itself and hands POSTs to this view
+class FoodListingView(generics.CreateAPIView):
+    serializer_class = FoodListingSerializer
+    permission_classes = [IsAuthenticated, IsRestaurant]
+
+
+# View to create many food listings at once (for restaurants). Validates the whole array
+# first and returns per-item errors; nothing is inserted unless every item is valid
+class BulkFoodListingView(generics.CreateAPIView):
     serializer_class = FoodListingSerializer
+    permission_classes = [IsAuthenticated, IsRestaurant]
+    max_batch_size = 100
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.update(many=True, allow_empty=False, max_length=self.max_batch_size)
+        return super().get_serializer(*args, **kwargs)
 
 
 # View to register a new restaurant
@@ -47,24 +137,28 @@ class RestaurantRegistrationView(generics.CreateAPIView):
     serializer_class = RestaurantSerializer
 
 
+def restaurants_with_food_listings():
+    # Load restaurants with their users and unclaimed listings in a constant number of
+    # queries; RestaurantSerializer reads the prefetched `available_food_listings`
+    return Restaurant.objects.select_related("user").prefetch_related(
+        Prefetch(
+            "food_listings",
+            queryset=FoodListing.objects.exclude(status__in=CLOSED_LISTING_STATUSES).order_by("-created_at", "-id"),
+            to_attr="available_food_listings",
+        )
+    )
+
+
 # View to list all registered restaurants
 class RestaurantListView(generics.ListAPIView):
-    queryset = Restaurant.objects.all()
     serializer_class = RestaurantSerializer
 
+    def get_queryset(self):
+        return restaurants_with_food_listings()
 
-class RestaurantDetailView(APIView):
-    def get(self, request, pk):
-        try:
-            restaurant = Restaurant.objects.get(id=pk)  # Fetch restaurant by ID
-        except Restaurant.DoesNotExist:
-            return Response(
-                {"detail": "Restaurant not found."}, status=status.HTTP_404_NOT_FOUND
-            )
-
-        # Serialize the restaurant and include food listings
-        serializer = RestaurantSerializer(restaurant)
-        return Response(serializer.data)
+    @cache_response("restaurants", models=(Restaurant, FoodListing, FoodClaim))
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
 
 # View to register a new NGO
@@ -77,7 +171,8 @@ class NGORegistrationView(generics.CreateAPIView):
 
 # View to list all registered NGOs
 class NGOListView(generics.ListAPIView):
-    queryset = NGO.objects.all()
+    # NGOSerializer renders each NGO's user
+    queryset = NGO.objects.select_related("user")
     serializer_class = NGOSerializer
 
 
@@ -86,7 +181,7 @@ class NGOListView(generics.ListAPIView):
 
 class ClaimFoodView(generics.CreateAPIView):
     serializer_class = FoodClaimSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsNGO]
 
     def perform_create(self, serializer):
         # Automatically associate the authenticated NGO with the claim (done in the serializer)
@@ -97,11 +192,33 @@ class ClaimFoodView(generics.CreateAPIView):
         return super().post(request, *args, **kwargs)
 
 
+# View to allow an NGO to claim several food listings in one request. Either every claim
+# succeeds or none do (409 with the shortfalls)
+class BatchClaimFoodView(generics.CreateAPIView):
+    serializer_class = BatchClaimSerializer
+    permission_classes = [IsAuthenticated, IsNGO]
+
+
 @api_view(["POST"])
 def logout_view(request):
     """
-    Logout the user by deleting their authentication token.
+    Logout the user by deleting their authentication token, or by blacklisting their JWT
+    access token (and the refresh token, if sent) until they expire.
     """
+    if isinstance(request.auth, JWTToken):
+        blacklist_token(request.auth)
+        refresh = request.data.get("refresh")
+        if refresh:
+            try:
+                blacklist_token(RefreshToken(refresh))
+            except TokenError:
+                return Response(
+                    {"detail": "Invalid refresh token."}, status=status.HTTP_400_BAD_REQUEST
+                )
+        return Response(
+            {"detail": "Successfully logged out."}, status=status.HTTP_200_OK
+        )
+
     try:
         # Get the token from request headers
         token = request.headers.get("Authorization").split()[1]
@@ -120,154 +237,191 @@ def logout_view(request):
     except IndexError:
         return Response({"detail": "Token not provided."}, status=status.HTTP_400_BAD_REQUEST)
     
+
+def filter_claimed_range(claims, params):
+    # Narrow the claims to the requested ?claimed_after= (inclusive) / ?claimed_before=
+    # (exclusive) range
+    claimed_after = parse_datetime_param(params, "claimed_after")
+    if claimed_after:
+        claims = claims.filter(claimed_at__gte=claimed_after)
+    claimed_before = parse_datetime_param(params, "claimed_before")
+    if claimed_before:
+        claims = claims.filter(claimed_at__lt=claimed_before)
+    return claims
+
+
+def claims_for_donation_history(claims, request):
+    # Join each claim's listing and restaurant in the same query, fetching only the
+    # columns FoodClaimDonationSerializer renders, as plain rows
+    claims = filter_claimed_range(claims, request.query_params)
+    return FoodClaimDonationSerializer.values_queryset(claims)
+
+
+def paginated_donation_history(claims, request, view):
+    paginator = FoodClaimCursorPagination()
+    page = paginator.paginate_queryset(claims_for_donation_history(claims, request), request, view=view)
+    return paginator.get_paginated_response(FoodClaimDonationSerializer.values_data(page))
+
+
 # View to list claims linked to a restaurant
 class RestaurantDonationsView(APIView):
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsRestaurant]
 
     def get(self, request):
-        try:
-            # Get the restaurant
-            restaurant = Restaurant.objects.get(user=request.user)
-        except Restaurant.DoesNotExist:
-            return Response({"detail": "Restaurant not found."}, status=status.HTTP_404_NOT_FOUND)
-
-        # Fetch claims linked to the restaurant's food listings
-        claims = FoodClaim.objects.filter(food_listing__restaurant=restaurant)
+        # Fetch claims linked to the restaurant's food listings, archived ones included
+        # (IsRestaurant resolved the id)
+        claims = claim_history(food_listing__restaurant_id=request.restaurant_id)
 
-        # Serialize the claims
-        serializer = FoodClaimDonationSerializer(claims, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # Serialize one page of the claims
+        return paginated_donation_history(claims, request, self)
 
 
 # View to list past claims by an NGO
 class NGOClaimsView(APIView):
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsNGO]
 
     def get(self, request):
-        try:
-            # Get the NGO
-            ngo = NGO.objects.get(user=request.user)
-        except NGO.DoesNotExist:
-            return Response({"detail": "NGO not found."}, status=status.HTTP_404_NOT_FOUND)
+        # Fetch all claims made by the NGO, archived ones included (IsNGO resolved the id)
+        claims = claim_history(ngo_id=request.ngo_id)
 
-        # Fetch all claims made by the NGO
-        claims = FoodClaim.objects.filter(ngo=ngo)
+        # Serialize one page of the claims
+        return paginated_donation_history(claims, request, self)
 
-        # Serialize the data
-        serializer = FoodClaimDonationSerializer(claims, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
 
-class CustomObtainAuthToken(ObtainAuthToken):
-    authentication_classes = []
-    permission_classes = [AllowAny]
-    
-class DonationStatisticsView(APIView):
+# Streaming exports (?format=csv or ?format=ndjson). Rows are read with values_list()
+# projections and .iterator(), so memory use doesn't grow with the size of the history
+class ExportView(APIView):
+    renderer_classes = [CSVRenderer, NDJSONRenderer]
+    filename = None
+    # Export column name -> field lookup
+    columns = {}
+
+    def get_rows(self, request):
+        raise NotImplementedError
 
     def get(self, request):
-        # Current date and time
-        now = datetime.now()
-        
-        # Calculate total donations
-        total_stats = FoodClaim.objects.aggregate(
-            total_claims=Count('id'),
-            total_quantity=Sum('claimed_quantity')
+        rows = self.get_rows(request).values_list(*self.columns.values())
+        return streaming_export(
+            request.accepted_renderer.format,
+            list(self.columns),
+            rows.iterator(chunk_size=EXPORT_CHUNK_SIZE),
+            self.filename,
+            asynchronous=isinstance(request._request, ASGIRequest),
         )
 
-        # Calculate current month's donations
-        current_month_stats = FoodClaim.objects.filter(
-            food_listing__created_at__year=now.year,
-            food_listing__created_at__month=now.month
-        ).aggregate(
-            total_claims=Count('id'),
-            total_quantity=Sum('claimed_quantity')
+    def finalize_response(self, request, response, *args, **kwargs):
+        # Errors are regular DRF responses; report them as JSON rather than in the export format
+        if isinstance(response, Response):
+            request.accepted_renderer = FastJSONRenderer()
+            request.accepted_media_type = FastJSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ClaimExportView(ExportView):
+    columns = {
+        "id": "id",
+        "food_listing_id": "food_listing_id",
+        "food_name": "food_listing__food_name",
+        "available_pickup_times": "food_listing__available_pickup_times",
+        "pickup_address": "food_listing__pickup_address",
+        "restaurant_name": "food_listing__restaurant__name",
+        "claimed_quantity": "claimed_quantity",
+        "claimed_at": "claimed_at",
+    }
+
+    def get_claims(self, request):
+        raise NotImplementedError
+
+    def get_rows(self, request):
+        claims = filter_claimed_range(self.get_claims(request), request.query_params)
+        return claims.order_by("-claimed_at", "-id")
+
+
+# Export of the claims linked to a restaurant
+class RestaurantDonationsExportView(ClaimExportView):
+    permission_classes = [IsAuthenticated, IsRestaurant]
+    filename = "donations"
+
+    def get_claims(self, request):
+        return claim_history(food_listing__restaurant_id=request.restaurant_id)
+
+
+# Export of the claims made by an NGO
+class NGOClaimsExportView(ClaimExportView):
+    permission_classes = [IsAuthenticated, IsNGO]
+    filename = "claims"
+
+    def get_claims(self, request):
+        return claim_history(ngo_id=request.ngo_id)
+
+
+# Export of food listings, with the same filters as the listings feed
+class FoodListingExportView(ExportView):
+    filename = "food-listings"
+    columns = {
+        "id": "id",
+        "food_name": "food_name",
+        "total_quantity": "total_quantity",
+        "remaining_quantity": "remaining_quantity",
+        "available_pickup_times": "available_pickup_times",
+        "pickup_address": "pickup_address",
+        "special_instructions": "special_instructions",
+        "created_at": "created_at",
+        "status": "status",
+        "restaurant": "restaurant_id",
+    }
+
+    def get_rows(self, request):
+        listings = filter_food_listings(FoodListing.objects.all(), request.query_params)
+        return listings.order_by("-created_at", "-id")
+
+
+# Export of donations per month across all years, from the daily rollup
+class MonthlyDonationStatsExportView(ExportView):
+    filename = "monthly-donations"
+    columns = {
+        "month": "month",
+        "donations_count": "donations_count",
+        "total_claimed_quantity": "total_claimed_quantity",
+    }
+
+    def get_rows(self, request):
+        return (
+            DonationDailyRollup.objects.annotate(month=TruncMonth("day"))
+            .values("month")
+            .annotate(donations_count=Sum("claims_count"), total_claimed_quantity=Sum("quantity"))
+            .order_by("month")
         )
 
-        # Calculate last month's donations
-        last_month = (now.replace(day=1) - timedelta(days=1))  # Last month's last day
-        last_month_stats = FoodClaim.objects.filter(
-            food_listing__created_at__year=last_month.year,
-            food_listing__created_at__month=last_month.month
-        ).aggregate(
-            total_claims=Count('id'),
-            total_quantity=Sum('claimed_quantity')
-        )
-        
-        # Fetch recent donations (last 5 restaurants with their most recent donation)
-        recent_donations = (
-            FoodClaim.objects.select_related('food_listing', 'food_listing__restaurant')
-            .filter(food_listing__restaurant__isnull=False)  # Ensure restaurant exists
-            .values('food_listing__restaurant__id', 'food_listing__restaurant__name')
-            .annotate(
-                most_recent_claim=Max('claimed_at'),  # Get the most recent claim per restaurant
-                most_recent_claim_quantity=Max('claimed_quantity')  # Get the most recent claimed quantity
-            )
-            .order_by('-most_recent_claim')  # Order by the most recent claim date
-        )[:5]
-
-        # Format the response for recent donations
-        recent_donations_data = []
-        for donation in recent_donations:
-            # Get the most recent food claim and associated food listing for the restaurant
-            recent_claim = FoodClaim.objects.filter(
-                food_listing__restaurant_id=donation['food_listing__restaurant__id'],
-                claimed_at=donation['most_recent_claim']
-            ).first()
-
-            if recent_claim:
-                recent_donations_data.append({
-                    'restaurant_name': donation['food_listing__restaurant__name'],
-                    'most_recent_donation': {
-                        'food_name': recent_claim.food_listing.food_name,
-                        'claimed_quantity': recent_claim.claimed_quantity,
-                        'pickup_address': recent_claim.food_listing.pickup_address,
-                        'donation_date': recent_claim.claimed_at.strftime('%Y-%m-%d %H:%M:%S')
-                    }
-                })
-
-        # Format the response
-        response_data = {
-            "total_donations": {
-                "total_donations": total_stats['total_claims'] or 0,
-                "total_quantity": total_stats['total_quantity'] or 0,
-            },
-            "current_month_donations": {
-                "total_donations": current_month_stats['total_claims'] or 0,
-                "total_quantity": current_month_stats['total_quantity'] or 0,
-            },
-            "last_month_donations": {
-                "total_donations": last_month_stats['total_claims'] or 0,
-                "total_quantity": last_month_stats['total_quantity'] or 0,
-            },
-            "recent_donations": recent_donations_data 
-        }
-
-        return Response(response_data, status=200)
-
-
-class MonthlyDonationStatsView(APIView):
 
-    def get(self, request):
-        # Current date to get this year
-        current_year = datetime.now().year
-        
-        # Query to get number of donations and total quantity for each month in the current year
-        donations_per_month = FoodClaim.objects.filter(
-            claimed_at__year=current_year  # Filter claims from this year
-        ).annotate(month=TruncMonth('claimed_at')).values('month').annotate(
-            donations_count=Count('id'),  # Count the number of donations
-            total_claimed_quantity=Sum('claimed_quantity')  # Sum the claimed quantity
-        ).order_by('month')  # Order by month
-        
-        # Format the data into a list of dictionaries
-        monthly_donations = []
-        for donation in donations_per_month:
-            monthly_donations.append({
-                'month': donation['month'].strftime('%B'),  # Month name (e.g. January, February)
-                'year': donation['month'].year,
-                'donations_count': donation['donations_count'],
-                'total_claimed_quantity': donation['total_claimed_quantity'],  # Total claimed quantity
-            })
-        
-        return Response({
-            'monthly_donations': monthly_donations
-        }, status=200)
\ No newline at end of file
+class CustomObtainAuthToken(ObtainAuthToken):
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+
+# JWT login/refresh (enabled with JWT_AUTH_ENABLED)
+class JWTLoginView(TokenObtainPairView):
+    serializer_class = RoleTokenObtainPairSerializer
+
+
+class JWTRefreshView(TokenRefreshView):
+    serializer_class = BlacklistAwareTokenRefreshSerializer
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint for the request metrics (see base/metrics.py). Needs
+    "Authorization: Bearer <METRICS_TOKEN>" when a token is configured, and a logged-in
+    staff user (admin session) otherwise.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}".encode()
+        allowed = hmac.compare_digest(request.headers.get("Authorization", "").encode(), expected)
+    else:
+        allowed = request.user.is_active and request.user.is_staff
+    if not allowed:
+        return HttpResponse("Unauthorized\n", status=401, content_type="text/plain")
+    return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
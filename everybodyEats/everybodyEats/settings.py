@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -65,15 +66,50 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework.authentication.TokenAuthentication",
+        "base.authentication.CachedTokenAuthentication",
     ],
     # 'DEFAULT_PERMISSION_CLASSES': [
     #     'rest_framework.permissions.IsAuthenticated',
     # ],
+    # JSON is encoded/decoded with orjson when it is installed (same output as DRF's)
+    "DEFAULT_RENDERER_CLASSES": [
+        "base.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "base.renderers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+}
+
+# Opt-in stateless JWT auth (simplejwt): enables /api/jwt/login/ and /api/jwt/refresh/ and
+# accepts "Authorization: Bearer <access token>" alongside the DB-backed tokens
+JWT_AUTH_ENABLED = config("JWT_AUTH_ENABLED", default=False, cast=bool)
+
+if JWT_AUTH_ENABLED:
+    REST_FRAMEWORK["DEFAULT_AUTHENTICATION_CLASSES"].append(
+        "base.tokens.StatelessJWTAuthentication"
+    )
+
+# Cache alias holding revoked (logged out) JWTs until they expire. Every process must see
+# it, so it can't be a local memory cache (enforced by a system check)
+JWT_BLACKLIST_CACHE_ALIAS = config("JWT_BLACKLIST_CACHE_ALIAS", default="default")
+
+SIMPLE_JWT = {
+    "ACCESS_TOKEN_LIFETIME": timedelta(
+        minutes=config("JWT_ACCESS_TOKEN_MINUTES", default=5, cast=int)
+    ),
+    "REFRESH_TOKEN_LIFETIME": timedelta(
+        days=config("JWT_REFRESH_TOKEN_DAYS", default=1, cast=int)
+    ),
+    "AUTH_HEADER_TYPES": ("Bearer",),
 }
 
 
 MIDDLEWARE = [
+    # First, so its query counts and timings cover the whole stack
+    "base.metrics.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -118,9 +154,88 @@ DATABASES = {
         "PASSWORD": config("DB_PASSWORD"),
         "HOST": config("DB_HOST"),
         "PORT": config("DB_PORT", default="5432"),
+        # Seconds to keep a connection open between requests. The default (0, close it
+        # after each request) suits the ASGI deployment, where requests run their queries
+        # in short-lived threads and idle persistent connections pile up; pool with
+        # PgBouncer there. Under a WSGI server with sync workers set it to e.g. 60 to skip
+        # the connection handshake. Health checks replace a connection that died while
+        # idle before it is reused
+        "CONN_MAX_AGE": config("DB_CONN_MAX_AGE", default=0, cast=int),
+        "CONN_HEALTH_CHECKS": config("DB_CONN_HEALTH_CHECKS", default=True, cast=bool),
+        "OPTIONS": {
+            "connect_timeout": config("DB_CONNECT_TIMEOUT", default=5, cast=int),
+        },
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Local memory by default; point CACHE_BACKEND at
+# django.core.cache.backends.filebased.FileBasedCache (LOCATION is a directory) or
+# django.core.cache.backends.redis.RedisCache (LOCATION is a redis:// URL) in production.
+
+CACHES = {
+    "default": {
+        "BACKEND": config(
+            "CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": config("CACHE_LOCATION", default="everybody-eats"),
     }
 }
 
+# Response cache for the read-heavy public endpoints, TTLs in seconds (0 disables)
+RESPONSE_CACHE_ALIAS = "default"
+
+RESPONSE_CACHE_TTLS = {
+    "donation_statistics": config("CACHE_TTL_DONATION_STATISTICS", default=60, cast=int),
+    "monthly_donations": config("CACHE_TTL_MONTHLY_DONATIONS", default=300, cast=int),
+    "restaurants": config("CACHE_TTL_RESTAURANTS", default=30, cast=int),
+    "restaurant_detail": config("CACHE_TTL_RESTAURANT_DETAIL", default=30, cast=int),
+}
+
+# How long a resolved auth token -> user mapping stays cached, in seconds (0 disables).
+# Logging out only clears the entry in the cache it runs against, so with the per-process
+# local memory cache the default is off
+AUTH_TOKEN_CACHE_TTL = config(
+    "AUTH_TOKEN_CACHE_TTL",
+    default=0 if CACHES["default"]["BACKEND"] == "django.core.cache.backends.locmem.LocMemCache" else 300,
+    cast=int,
+)
+
+# How long a user's role (restaurant/ngo) and profile id stay cached, in seconds
+USER_ROLE_CACHE_TTL = config("USER_ROLE_CACHE_TTL", default=3600, cast=int)
+
+# Geocoder for restaurant and pickup addresses (see base/geo.py): "base.geo.NullGeocoder"
+# (no lookups), "base.geo.StubGeocoder" (local/tests) or "base.geo.NominatimGeocoder"
+GEOCODER = config("GEOCODER", default="base.geo.NullGeocoder")
+GEOCODER_URL = config("GEOCODER_URL", default="")
+GEOCODER_USER_AGENT = config("GEOCODER_USER_AGENT", default="everybody-eats")
+GEOCODER_CACHE_TTL = config("GEOCODER_CACHE_TTL", default=86400, cast=int)
+
+# Monthly range partitioning of the claims table on claimed_at (PostgreSQL only, see
+# base/partitions.py). Applied by migration 0018 when enabled, or later with
+# `manage.py create_claim_partitions --convert`
+FOOD_CLAIM_PARTITIONING = config("FOOD_CLAIM_PARTITIONING", default=False, cast=bool)
+FOOD_CLAIM_PARTITION_MONTHS_AHEAD = config("FOOD_CLAIM_PARTITION_MONTHS_AHEAD", default=3, cast=int)
+
+# Per-view request metrics (base/metrics.py): a Server-Timing header on every response,
+# Prometheus histograms at /api/metrics/ (which needs "Authorization: Bearer <token>" when
+# METRICS_TOKEN is set, and a logged-in staff user otherwise), and a warning with the SQL of any request running more than
+# QUERY_COUNT_LOG_THRESHOLD queries (0 disables it)
+METRICS_ENABLED = config("METRICS_ENABLED", default=True, cast=bool)
+METRICS_SERVER_TIMING = config("METRICS_SERVER_TIMING", default=True, cast=bool)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+QUERY_COUNT_LOG_THRESHOLD = config("QUERY_COUNT_LOG_THRESHOLD", default=50, cast=int)
+
+# Live food listing stream (/api/food-listings/events/, see base/events.py): events a slow
+# client may fall behind by before it is told to resync, keep-alive interval, how long a
+# stream stays open before the client reconnects, and the reconnect delay
+EVENT_STREAM_QUEUE_SIZE = config("EVENT_STREAM_QUEUE_SIZE", default=100, cast=int)
+EVENT_STREAM_HEARTBEAT_SECONDS = config("EVENT_STREAM_HEARTBEAT_SECONDS", default=15, cast=int)
+EVENT_STREAM_MAX_SECONDS = config("EVENT_STREAM_MAX_SECONDS", default=300, cast=int)
+EVENT_STREAM_RETRY_MS = config("EVENT_STREAM_RETRY_MS", default=3000, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators